@@ -20,9 +20,12 @@ for the definition of new cpu architectures:
 # Copyright (C) 2006-2014 Axel Tillequin (bdcht3@gmail.com)
 # published under GPLv2 license
 
+import os
 import inspect
 import importlib
 import codecs
+import hashlib
+import pickle
 from types import FunctionType
 from collections import defaultdict
 from functools import reduce
@@ -30,6 +33,7 @@ import pyparsing as pp
 
 from crysp.bits import Bits, pack, unpack
 
+from amoco.config import conf
 from amoco.logger import Log
 
 logger = Log(__name__)
@@ -186,6 +190,7 @@ class disassembler(object):
       iset: the lambda used to select the right specifications for decoding
       endian: the lambda used to define endianess.
       specs: the *tree* of :class:`ispec` objects that defines the cpu architecture.
+      tables: the compiled form of specs trees used for decoding (see :meth:`compile`).
     """
 
     def __init__(
@@ -204,12 +209,51 @@ class disassembler(object):
         # build ispecs tree for each set:
         logger.debug("building specs tree for modules %s", specmodules)
         # self.indent = 0
-        self.specs = [self.setup(m.ISPECS) for m in specmodules]
+        self.specs = [self.getspecs(m.ISPECS) for m in specmodules]
         # del self.indent
+        specs_cache_save()
+        self.compile()
         # some arch like x86 require a stateful decoding due to optional prefixes,
         # so we keep an __i instruction for decoding until a non prefix ispec is used.
         self.__i = None
 
+    def getspecs(self, ispecs):
+        """getspecs returns the tree of provided ispecs list, either from the
+        specs cache or by calling setup. The tree is indexed in the cache by the hash
+        of ispecs formats so that any change in the spec module invalidates it.
+        As setup does, the ispecs list is sorted in place.
+        """
+        h = hashlib.sha256()
+        for s in ispecs:
+            h.update(s.format.encode("utf-8") + b"\0")
+        key = (h.hexdigest(), self.endian(), self.maxlen)
+        trees = specs_cache()["trees"]
+        if key in trees:
+            order, t = trees[key]
+            ispecs[:] = [ispecs[i] for i in order]
+            return self.untree(t, ispecs)
+        index = dict(((id(s), i) for (i, s) in enumerate(ispecs)))
+        fl = self.setup(ispecs)
+        order = [index[id(s)] for s in ispecs]
+        index = dict(((id(s), i) for (i, s) in enumerate(ispecs)))
+        trees[key] = (order, self.totree(fl, index))
+        SPECS_CACHE["dirty"] = True
+        return fl
+
+    def totree(self, fl, index):
+        "replace ispecs of the tree by their index in the (sorted) ispecs list"
+        f, l = fl
+        if f == 0:
+            return (0, [index[id(s)] for s in l])
+        return (f, dict(((x, self.totree(t, index)) for (x, t) in l.items())))
+
+    def untree(self, fl, ispecs):
+        "replace ispecs indices of the tree by the ispecs objects"
+        f, l = fl
+        if f == 0:
+            return (0, [ispecs[i] for i in l])
+        return (f, dict(((x, self.untree(t, ispecs)) for (x, t) in l.items())))
+
     def setup(self, ispecs):
         """setup will (recursively) organize the provided ispecs list into an optimal tree so that
         __call__ can efficiently find the matching ispec format for a given bytestring
@@ -255,19 +299,45 @@ class disassembler(object):
         # self.indent -=2
         return (f, l)
 
-    def __call__(self, bytestring, **kargs):
-        e = self.endian(**kargs)
+    def compile(self):
+        """compile will translate every specs tree into a lookup table with
+        the same structure but where nodes are plain dicts indexed by the
+        integer value of the submask, and leaves are tuples of (mask,fix,ispec)
+        candidates where mask and fix are integers already adjusted to the
+        (setup-time) endianess. This allows __call__ to reject candidates with
+        integer arithmetic only rather than by letting ispec.decode raise
+        a DecodeError.
+        """
+        self.cendian = self.endian()
+        self.tables = [self.compile_tree(t) for t in self.specs]
+
+    def compile_tree(self, fl):
+        f, l = fl
+        if f != 0:
+            return (f, dict(((x, self.compile_tree(t)) for (x, t) in l.items())))
         adjust = lambda x: x.ival
-        if e == -1:
+        if self.cendian == -1:
             maxsize = self.maxlen * 8
             adjust = lambda x: x.ival << (maxsize - x.size)
-        b = adjust(Bits(bytestring[::e], bitorder=1))
-        # get organized/optimized tree of specs:
-        fl = self.specs[self.iset(**kargs)]
+        return (0, tuple(((adjust(s.mask), adjust(s.fix), s) for s in l)))
+
+    def __call__(self, bytestring, **kargs):
+        e = self.endian(**kargs)
+        if e == -1:
+            b = int.from_bytes(bytestring, "big")
+            b <<= self.maxlen * 8 - len(bytestring) * 8
+        else:
+            b = int.from_bytes(bytestring, "little")
+        # candidates masks are valid only for the endianess used to compile:
+        chk = e == self.cendian
+        # get organized/optimized lookup table of specs:
+        fl = self.tables[self.iset(**kargs)]
         while True:
             f, l = fl
             if f == 0:  # we are on a leaf...
-                for s in l:  # lets search linearly over this branch
+                for m, x, s in l:  # lets search linearly over this branch
+                    if chk and (b & m) != x:
+                        continue
                     try:
                         i = s.decode(bytestring, e, i=self.__i, iclass=self.iclass)
                     except (DecodeError, InstructionError):
@@ -297,6 +367,32 @@ class disassembler(object):
         self.__i = None
         return None
 
+    def disassemble_range(self, buffer, vaddr=0, end=None, **kargs):
+        """iterator over the instructions decoded from the given bytes-like
+        buffer assumed to be located at address vaddr. Instructions are
+        decoded linearly until address end (defaults to the end of buffer)
+        is reached or until no instruction matches.
+        The buffer is accessed through a memoryview so that only instructions'
+        bytes are copied. The address of yielded instructions is an integer.
+        """
+        mv = memoryview(buffer)
+        sz = len(mv)
+        sto = sz if end is None else min(sz, end - vaddr)
+        o = 0
+        while o < sto:
+            i = self(mv[o : o + self.maxlen], **kargs)
+            if i is None:
+                return
+            i.address = vaddr + o
+            xsz = i.misc["xsz"] or 0
+            if xsz > 0:
+                x = o + i.length
+                if x + xsz > sz:
+                    return
+                i.xdata(i, [bytes(mv[x : x + xsz])])
+            o += i.length
+            yield i
+
 
 # -----------------------------------------
 
@@ -326,6 +422,9 @@ class ispec(object):
         size (int): the bit length of the format (``LEN`` value)
         fix (Bits): the values of fixed bits within the format
         mask (Bits): the mask of fixed bits within the format
+        bits (bool): True if decoding needs a Bits instance (variable length
+                     format or some directives decoded as Bits/string), otherwise
+                     the format is decoded with integer arithmetic only.
 
     Examples:
 
@@ -412,6 +511,7 @@ class ispec(object):
         "mask",
         "pfx",
         "size",
+        "bits",
         "hook",
     ]
 
@@ -457,7 +557,7 @@ class ispec(object):
         return "".join(s)
 
     def buildspec(self):
-        ast = specdecode.parseString(self.format, True)
+        ast = specparse(self.format)
         size, direction = ast[0]
         self.size = size
         fmt = ast[1]
@@ -486,6 +586,12 @@ class ispec(object):
                     size += loc
         if size % 8 != 0:
             logger.error("ispec length not a multiple of 8 %s" % self.format)
+        # check if the bitstring can be decoded as an integer:
+        self.bits = (not chklen) or any(
+            (("~" in d[0]) or ("#" in d[0]) or (d[2] == "*"))
+            for d in fmt
+            if isinstance(d, tuple)
+        )
         self.fix = Bits(0, size)  # values of fixed bits
         self.mask = Bits(0, size)  # location of fixed bits
         i = 0
@@ -546,8 +652,10 @@ class ispec(object):
                 f = lambda b, p=sta, q=sto: b[p:q]
             elif "#" in opt:
                 f = lambda b, p=sta, q=sto, x=go: str(b[p:q])[::x]
-            else:
+            elif self.bits:
                 f = lambda b, p=sta, q=sto: b[p:q].ival
+            else:
+                f = lambda v, p=sta, m=(1 << (sto - sta)) - 1: (v >> p) & m
             D[symbol] = f
         if count != size:
             logger.error("ispec size mismatch (%s)" % self.format)
@@ -560,15 +668,16 @@ class ispec(object):
         if len(istr) < blen:
             raise DecodeError
         bs = istr[0:blen]
-        # Bits object created with LSB to MSB byte string:
-        ival = bs[::endian]
-        b = Bits(ival, self.fix.size, bitorder=1)
-        if b & self.mask != self.fix:
+        b = int.from_bytes(bs, "little" if endian == 1 else "big")
+        if b & self.mask.ival != self.fix.ival:
             raise DecodeError
-        if self.size == 0:  # variable length spec:
-            if endian != 1:
-                logger.error("invalid endianess")
-            b = b // Bits(istr[blen:], bitorder=1)
+        if self.bits:
+            # Bits object created with LSB to MSB byte string:
+            b = Bits(b, self.fix.size)
+            if self.size == 0:  # variable length spec:
+                if endian != 1:
+                    logger.error("invalid endianess")
+                b = b // Bits(bytes(istr[blen:]), bitorder=1)
         # create & update instruction object:
         if i is None:
             i = iclass(bs)
@@ -691,6 +800,83 @@ specmore = pp.Optional(pp.Suppress("&") + number, default=0)
 specdecode = speclen + specformat + specoption + specmore
 
 
+def specparse(format):
+    """parse the ispec format string and return its ast as a tuple
+    ((size, direction), fmt, pfx, xsz) where fmt is the tuple of parsed
+    directives. Results are kept in the specs cache.
+    """
+    formats = specs_cache()["formats"]
+    if format in formats:
+        return formats[format]
+    r = specdecode.parseString(format, True)
+    fmt = tuple(((tuple(d) if isinstance(d, pp.ParseResults) else d) for d in r[1]))
+    ast = (tuple(r[0]), fmt, r[2], r[3])
+    formats[format] = ast
+    SPECS_CACHE["dirty"] = True
+    return ast
+
+
+# ispecs cache:
+# -------------
+# Parsing ispec formats (and to a lesser extent building specs trees) accounts
+# for most of the time needed to import a cpu module. Parsed formats and trees
+# are kept in SPECS_CACHE which is loaded from (and saved to) a file located in
+# the conf.Arch.cache directory if defined. The name of this file depends on the
+# hash of this module's source so that any change in the parser or in the way
+# trees are built invalidates previous cache files.
+
+SPECS_CACHE = {"formats": {}, "trees": {}, "file": None, "dirty": False}
+
+try:
+    with open(__file__, "rb") as _f:
+        SPECS_CACHE_VERSION = hashlib.sha256(_f.read()).hexdigest()[:16]
+except (OSError, NameError):
+    SPECS_CACHE_VERSION = None
+
+
+def specs_cache_file():
+    "returns the path of the ispecs cache file or None if the cache is disabled"
+    d = conf.Arch.cache
+    if not (d and SPECS_CACHE_VERSION):
+        return None
+    return os.path.join(os.path.expanduser(d), "ispecs-%s.pickle" % SPECS_CACHE_VERSION)
+
+
+def specs_cache():
+    "returns the ispecs cache, loading it from the cache file if needed"
+    f = specs_cache_file()
+    if f is not None and f != SPECS_CACHE["file"]:
+        SPECS_CACHE["file"] = f
+        try:
+            with open(f, "rb") as fd:
+                c = pickle.load(fd)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            logger.verbose("no valid ispecs cache file %s" % f)
+        else:
+            SPECS_CACHE["formats"].update(c["formats"])
+            SPECS_CACHE["trees"].update(c["trees"])
+    return SPECS_CACHE
+
+
+def specs_cache_save():
+    "save the ispecs cache in its cache file if it has been updated"
+    f = SPECS_CACHE["file"]
+    if f is None or not SPECS_CACHE["dirty"]:
+        return
+    c = {"formats": SPECS_CACHE["formats"], "trees": SPECS_CACHE["trees"]}
+    # write to a temporary file first to allow concurrent processes:
+    tmp = "%s.%d" % (f, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(f), exist_ok=True)
+        with open(tmp, "wb") as fd:
+            pickle.dump(c, fd, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, f)
+    except OSError as e:
+        logger.warning("can't save ispecs cache file %s (%s)" % (f, e))
+    else:
+        SPECS_CACHE["dirty"] = False
+
+
 def ispec_register(x, module):
     F = []
     try:
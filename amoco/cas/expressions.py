@@ -83,6 +83,15 @@ def _checkarg_slice(f):
     return checkarg_slice
 
 
+# structural hashing:
+# --------------------
+# The hash of an expression is computed from its structure rather than from
+# its string representation: _hkey() returns a tuple made of raw values and
+# of the _hkey() tuples of sub-expressions, and two expressions are equal
+# iff their keys are equal. The hash is not cached since sub-expressions
+# are sometimes updated in place (e.g. the disp of a mem pointer.)
+
+
 # atoms:
 # ------
 
@@ -356,7 +365,11 @@ class exp(object):
     # WARNING: comparison operators cmp returns a python bool
     # but any other operators always return an expression !
     def __hash__(self):
-        return hash("%s" % self) + self.size
+        return hash(self._hkey())
+
+    def _hkey(self):
+        "returns the tuple that identifies the structure of the expression"
+        return (self._is_def, self.size)
 
     # An expression defaults to False, and only bit1 will return True.
     def __bool__(self):
@@ -368,37 +381,37 @@ class exp(object):
             n = cst(n, self.size)
         elif isinstance(n, (float)):
             n = cfp(n, self.size)
-        if hash(self) == hash(n):
+        if self is n or self._hkey() == n._hkey():
             return bit1
         return oper(OP_EQ, self, n)
 
     @_checkarg_numeric
     def __ne__(self, n):
-        if hash(self) == hash(n):
+        if self is n or self._hkey() == n._hkey():
             return bit0
         return oper(OP_NEQ, self, n)
 
     @_checkarg_numeric
     def __lt__(self, n):
-        if hash(self) == hash(n):
+        if self is n or self._hkey() == n._hkey():
             return bit0
         return oper(OP_LT, self, n)
 
     @_checkarg_numeric
     def __le__(self, n):
-        if hash(self) == hash(n):
+        if self is n or self._hkey() == n._hkey():
             return bit1
         return oper(OP_LE, self, n)
 
     @_checkarg_numeric
     def __ge__(self, n):
-        if hash(self) == hash(n):
+        if self is n or self._hkey() == n._hkey():
             return bit1
         return oper(OP_GE, self, n)
 
     @_checkarg_numeric
     def __gt__(self, n):
-        if hash(self) == hash(n):
+        if self is n or self._hkey() == n._hkey():
             return bit0
         return oper(OP_GT, self, n)
 
@@ -475,6 +488,10 @@ class cst(exp):
     def __unicode__(self):
         return "{:#x}".format(self.value)
 
+    # the hash does not depend on the sign flag:
+    def _hkey(self):
+        return ("c", self.v, self.size)
+
     def toks(self, **kargs):
         return [(render.Token.Constant, "%s" % self)]
 
@@ -727,6 +744,9 @@ class sym(cst):
     def __unicode__(self):
         return "#%s" % self.ref
 
+    def _hkey(self):
+        return ("#", self.ref, self.size)
+
 
 class cfp(exp):
     "floating point concrete value expression"
@@ -751,6 +771,9 @@ class cfp(exp):
     def __unicode__(self):
         return "{:f}".format(self.value)
 
+    def _hkey(self):
+        return ("f", self.v, self.size)
+
     def toks(self, **kargs):
         return [(render.Token.Constant, "%s" % self)]
 
@@ -899,6 +922,9 @@ class reg(exp):
     def __unicode__(self):
         return "%s" % self.ref
 
+    def _hkey(self):
+        return ("r", self.ref, self.size)
+
     def toks(self, **kargs):
         return [(render.Token.Register, "%s" % self)]
 
@@ -983,6 +1009,9 @@ class ext(reg):
     def __unicode__(self):
         return "@%s" % self.ref
 
+    def _hkey(self):
+        return ("@", self.ref, self.size)
+
     def toks(self, **kargs):
         tk = render.Token.Tainted if "!" in self.ref else render.Token.Name
         return [(tk, "%s" % self)]
@@ -1075,6 +1104,10 @@ class comp(exp):
             cur += nv.size
         return s + " }"
 
+    def _hkey(self):
+        parts = sorted(self.parts.items(), key=operator.itemgetter(0))
+        return ("C", self.size, tuple((k, v._hkey()) for (k, v) in parts))
+
     def toks(self, **kargs):
         if "indent" in kargs:
             p = kargs.get("indent", 0)
@@ -1286,6 +1319,9 @@ class mem(exp):
         n = "$%d" % n if n > 0 else ""
         return "M%d%s%s" % (self.size, n, self.a)
 
+    def _hkey(self):
+        return ("M", self.size, len(self.mods), self.a._hkey())
+
     def toks(self, **kargs):
         return [(render.Token.Memory, "%s" % self)]
 
@@ -1375,6 +1411,11 @@ class ptr(exp):
         d = self.disp_tostring()
         return "%s(%s%s)" % (self.seg, self.base, d)
 
+    def _hkey(self):
+        seg = self.seg._hkey() if isinstance(self.seg, exp) else self.seg
+        disp = self.disp._hkey() if isinstance(self.disp, exp) else self.disp
+        return ("P", self.size, seg, self.base._hkey(), disp)
+
     def disp_tostring(self, base10=True):
         if hasattr(self.disp, "_is_cst"):
             # When allowing label in expressions, e.g. when parsing
@@ -1449,6 +1490,7 @@ class slc(exp):
     __slots__ = ["x", "pos", "ref", "__protect", "_is_reg"]
     _is_def = True
     _is_slc = True
+    __hash__ = exp.__hash__
     __eq__ = exp.__eq__
 
     def __init__(self, x, pos, size, ref=None):
@@ -1492,15 +1534,16 @@ class slc(exp):
     def __unicode__(self):
         return self.ref or self.raw()
 
+    # the ref attribute is not taken into account:
+    def _hkey(self):
+        return ("S", self.x._hkey(), self.pos, self.size)
+
     def toks(self, **kargs):
         if self._is_reg:
             return [(render.Token.Register, "%s" % self)]
         subpart = [(render.Token.Literal, "[%d:%d]" % (self.pos, self.pos + self.size))]
         return self.x.toks(**kargs) + subpart
 
-    def __hash__(self):
-        return hash(self.raw())  # lgtm [py/equals-hash-mismatch]
-
     def depth(self):
         return 2 * self.x.depth()
 
@@ -1606,6 +1649,9 @@ class tst(exp):
     def __unicode__(self):
         return "(%s ? %s : %s)" % (self.tst, self.l, self.r)
 
+    def _hkey(self):
+        return ("?", self.tst._hkey(), self.l._hkey(), self.r._hkey())
+
     def toks(self, **kargs):
         ttest = self.tst.toks(**kargs)
         ttest.append((render.Token.Literal, " ? "))
@@ -1719,6 +1765,9 @@ class op(exp):
     def __unicode__(self):
         return "(%s%s%s)" % (self.l, self.op.symbol, self.r)
 
+    def _hkey(self):
+        return ("O", self.op.symbol, self.l._hkey(), self.r._hkey(), self.size)
+
     def toks(self, **kargs):
         l = self.l.toks(**kargs)
         l.insert(0, (render.Token.Literal, "("))
@@ -1806,6 +1855,9 @@ class uop(exp):
     def __unicode__(self):
         return "(%s%s)" % (self.op.symbol, self.r)
 
+    def _hkey(self):
+        return ("U", self.op.symbol, self.r._hkey(), self.size)
+
     def toks(self, **kargs):
         r = self.r.toks(**kargs)
         r.append((render.Token.Literal, ")"))
@@ -2221,7 +2273,7 @@ def eqn2_helpers(e, bitslice=False, widening=False):
         return vec([e.op(x, e.r) for x in e.l.l]).simplify(widening=widening)
     if e.r._is_vec:
         return vec([e.op(e.l, x) for x in e.r.l]).simplify(widening=widening)
-    if "%s" % (e.l) == "%s" % (e.r):
+    if e.l._hkey() == e.r._hkey():
         if e.op.symbol in (OP_NEQ, OP_LT, OP_GT):
             return bit0
         if e.op.symbol in (OP_EQ, OP_LE, OP_GE):
@@ -2283,6 +2335,9 @@ class vec(exp):
         s = ",".join(["%s" % x for x in self.l])
         return "[%s]" % (s)
 
+    def _hkey(self):
+        return ("V", tuple(x._hkey() for x in self.l), self.size)
+
     def toks(self, **kargs):
         t = []
         for x in self.l:
@@ -2368,6 +2423,9 @@ class vecw(top):
         s = ",".join(["%s" % x for x in self.l])
         return "[%s, ...]" % (s)
 
+    def _hkey(self):
+        return ("W", tuple(x._hkey() for x in self.l), self.size)
+
     def toks(self, **kargs):
         t = []
         for x in self.l:
@@ -152,7 +152,8 @@ class mapper(object):
     def R(self, x):
         "get the expression of register x"
         if self.csi:
-            return self.__map.get(x, self.csi(x))
+            r = self.__map.get(x, None)
+            return self.csi(x) if r is None else r
         else:
             return self.__map.get(x, x)
 
@@ -263,9 +264,10 @@ class mapper(object):
             self.__map.lastw = len(self.__map) + 1
         else:
             r = self.R(loc)
-            if r._is_reg:
-                r = comp(loc.size)
-                r[0 : loc.size] = loc
+            if r._is_reg or loc not in self.__map:
+                # new comp for loc (possibly initialized by csi):
+                r, x = comp(loc.size), r
+                r[0 : loc.size] = x
             pos = k.pos if k._is_slc else 0
             r[pos : pos + k.size] = v.simplify()
         self.__map[loc] = r
@@ -275,16 +277,28 @@ class mapper(object):
         instr(self)
 
     def safe_update(self, instr):
-        "update of the self mapper with instruction *only* if no exception occurs"
+        """update of the self mapper with instruction *only* if no exception occurs.
+           The instruction is executed once in a new mapper whose input locations
+           are fetched from self (see csi), so that only the resulting locations
+           need to be committed into self.
+        """
         try:
-            m = mapper()
+            m = mapper(csi=self.__getitem__)
             instr(m)
-            _ = self >> m
         except Exception as e:
             logger.error("instruction @ %s raises exception %s" % (instr.address, e))
             raise e
         else:
-            self.update(instr)
+            self.__Mem.merge(m.mmap)
+            for loc, v in m:
+                if loc._is_ptr:
+                    if loc in self.__map:
+                        del self.__map[loc]
+                    self.__map.lastw = len(self.__map) + 1
+                    self.__map[loc] = v
+                else:
+                    self.__map[loc] = v
+            self.conds += m.conds
 
     def __call__(self, x):
         """evaluation of expression x in this map:
@@ -293,7 +307,7 @@ class mapper(object):
            is the expression of p "after execution" whereas the indexing form
            uses p as an input (i.e "before execution") expression.
         """
-        if len(self) == 0:
+        if len(self) == 0 and not self.csi:
             return x
         return x.eval(self)
 
@@ -20,9 +20,10 @@ from amoco.logger import Log
 logger = Log(__name__)
 logger.debug("loading module")
 
+from bisect import bisect_left, bisect_right
+
 from grandalf.graphs import Vertex, Edge, Graph
 from amoco.cas.mapper import mapper
-from amoco.system.memory import MemoryZone
 from collections import defaultdict
 from amoco.code import _code_misc_default
 
@@ -195,6 +196,83 @@ class link(Edge):
         self.deg = 0 if xi == yi else 1
 
 
+# ------------------------------------------------------------------------------
+class blockindex(object):
+    """An index of (non-overlapping) block nodes sorted by start address.
+
+    Attributes:
+        addr (list[int]): the sorted list of nodes' start addresses.
+        nodes (list[node]): the nodes, in the order of addr.
+
+    Methods:
+        locate(vaddr): returns the index of the last node that starts at or
+            before vaddr, or None.
+
+        end(i): returns the end address of the i-th node.
+
+        get(vaddr): returns the node that contains address vaddr, or None.
+
+        after(i): returns the node that follows the i-th node (the first node
+            if i is None), or None.
+
+        insert(v): adds node v at its start address.
+
+        remove(v): removes node v from the index.
+    """
+
+    __slots__ = ["addr", "nodes"]
+
+    def __init__(self):
+        self.addr = []
+        self.nodes = []
+
+    @staticmethod
+    def key(vaddr):
+        return getattr(vaddr, "value", vaddr)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __getitem__(self, i):
+        return self.nodes[i]
+
+    def locate(self, vaddr):
+        i = bisect_right(self.addr, self.key(vaddr))
+        return i - 1 if i > 0 else None
+
+    def end(self, i):
+        return self.addr[i] + len(self.nodes[i])
+
+    def get(self, vaddr):
+        i = self.locate(vaddr)
+        if i is not None and self.key(vaddr) < self.end(i):
+            return self.nodes[i]
+        return None
+
+    def after(self, i):
+        i = 0 if i is None else i + 1
+        return self.nodes[i] if i < len(self.nodes) else None
+
+    def insert(self, v):
+        a = self.key(v.data.address)
+        i = bisect_left(self.addr, a)
+        if i < len(self.addr) and self.addr[i] == a:
+            self.nodes[i] = v
+        else:
+            self.addr.insert(i, a)
+            self.nodes.insert(i, v)
+
+    def remove(self, v):
+        a = self.key(v.data.address)
+        i = bisect_left(self.addr, a)
+        if i < len(self.addr) and self.nodes[i] is v:
+            del self.addr[i]
+            del self.nodes[i]
+
+
 # ------------------------------------------------------------------------------
 class graph(Graph):
     """a :ref:`<grandalf:Graph>` that represents a set of functions as its
@@ -207,11 +285,12 @@ class graph(Graph):
     Attributes:
         C : the list of :class:`graph_core <grandalf:graph_core>` connected
             components of the graph.
-        support (:class:`~system.core.MemoryZone`): the abstract memory zone
-            holding all nodes contained in this graph.
-        overlay : defaults to None, another instance of MemoryZone
-            with nodes of the graph that overlap other nodes already mapped
+        support (:class:`blockindex`): the address index of all block nodes
+            contained in this graph.
+        overlay : defaults to None, another instance of blockindex
+            with nodes of the graph that overlap other nodes already indexed
             in :attr:`support`.
+        names (dict): the nodes of the graph by name.
 
     Methods:
         get_by_name(name): get the node with the given name (as string).
@@ -220,7 +299,7 @@ class graph(Graph):
             :class:`~cas.expressions.cst` expression.
 
         add_vertex(v,[support=None]): add node v to the graph and declare
-            node support in the default MemoryZone or the overlay zone if
+            node support in the default index or the overlay index if
             provided as support argument. This method deals with a node v
             that cuts or swallows a previously added node.
 
@@ -260,12 +339,21 @@ class graph(Graph):
     """
 
     def __init__(self, *args, **kargs):
-        self.support = MemoryZone()
+        self.support = blockindex()
         self.overlay = None
+        self.names = {}
         super(graph, self).__init__(*args, **kargs)
+        for v in self.V():
+            self.names.setdefault(v.name, v)
+            if v.data._is_block:
+                self.support.insert(v)
+
+    def __add_vertex(self, v):
+        v = super(graph, self).add_vertex(v)
+        self.names.setdefault(v.name, v)
+        return v
 
-    def __cut_add_vertex(self, v, mz, vaddr, mo):
-        oldnode = mo.data.val
+    def __cut_add_vertex(self, v, mz, vaddr, oldnode):
         if oldnode == v:
             return oldnode
         # so v cuts an existing block:
@@ -274,24 +362,26 @@ class graph(Graph):
         if not cutdone:
             if mz is self.overlay:
                 logger.warning("double overlay block at %s" % vaddr)
-                v = super(graph, self).add_vertex(v)
+                v = self.__add_vertex(v)
                 v.misc["double-overlay"] = 1
                 return v
-            overlay = self.overlay or MemoryZone()
+            overlay = self.overlay or blockindex()
             return self.add_vertex(v, support=overlay)
         else:
             oldnode.misc["cut"] = cutdone
-            v = super(graph, self).add_vertex(v)  # ! avoid recursion for add_edge
-            mz.write(vaddr, v)
+            v = self.__add_vertex(v)  # ! avoid recursion for add_edge
+            mz.insert(v)
+            # children of oldnode are moved to v:
+            children = oldnode.N(+1)
             self.add_edge(link(oldnode, v))
-            for n in oldnode.N(+1):
+            for n in children:
                 self.add_edge(link(v, n))
                 self.remove_edge(oldnode.e_to(n))
             return v
 
     def add_vertex(self, v, support=None):
         if v.data._is_func:
-            return super(graph, self).add_vertex(v)
+            return self.__add_vertex(v)
         # insert block:
         vaddr = v.data.address
         if support is None:
@@ -301,49 +391,51 @@ class graph(Graph):
             self.overlay = support
         i = support.locate(vaddr)
         # check if block intersects others:
-        if i is not None:
-            mo = support._map[i]
-            if vaddr in mo:
-                return self.__cut_add_vertex(v, support, vaddr, mo)
-            else:  # v does not cut an existing block,
-                try:  # but may swallow next one...
-                    nextmo = support._map[i + 1]
-                except IndexError:
-                    # no more nodes here so back to default case:
-                    pass
-                else:
-                    nextnode = nextmo.data.val
-                    if vaddr + len(v) > nextnode.data.address:
-                        # nextnode is inside v...
-                        # try to cut v at nextnode bound:
-                        cutdone = v.cut(nextnode.data.address)
-                        if not cutdone:
-                            # nextnode address does not match an instruction in v...
-                            # thats an overlay:
-                            if support is self.overlay:
-                                # we already are in overlay...
-                                logger.warning("double overlay block at %s" % vaddr)
-                                v = super(graph, self).add_vertex(v)
-                                v.misc["double-overlay"] = 1
-                                return v
-                            support = self.overlay or MemoryZone()
-        v = super(graph, self).add_vertex(v)  # before support write !!
-        support.write(vaddr, v)
+        if i is not None and support.key(vaddr) < support.end(i):
+            return self.__cut_add_vertex(v, support, vaddr, support[i])
+        # v does not cut an existing block, but may swallow next one...
+        nextnode = support.after(i)
+        if nextnode is not None and vaddr + len(v) > nextnode.data.address:
+            # nextnode is inside v...
+            # try to cut v at nextnode bound:
+            cutdone = v.cut(nextnode.data.address)
+            if not cutdone:
+                # nextnode address does not match an instruction in v...
+                # thats an overlay:
+                if support is self.overlay:
+                    # we already are in overlay...
+                    logger.warning("double overlay block at %s" % vaddr)
+                    v = self.__add_vertex(v)
+                    v.misc["double-overlay"] = 1
+                    return v
+                support = self.overlay or blockindex()
+                self.overlay = support
+        v = self.__add_vertex(v)  # before support write !!
+        support.insert(v)
         return v
 
+    def remove_vertex(self, v):
+        x = super(graph, self).remove_vertex(v)
+        if x is not None:
+            if self.names.get(x.name, None) is x:
+                del self.names[x.name]
+            if x.data._is_block:
+                self.support.remove(x)
+                if self.overlay is not None:
+                    self.overlay.remove(x)
+        return x
+
     def get_by_name(self, name):
-        for v in self.V():
-            if v.name == name:
-                return v
-        return None
+        v = self.names.get(name, None)
+        if v is None and not name.startswith("blck_"):
+            # func nodes may be added directly to a connected component:
+            for x in self.V():
+                if x.name == name:
+                    return x
+        return v
 
     def get_with_address(self, vaddr):
-        i = self.support.locate(vaddr)
-        if i is not None:
-            mo = self.support._map[i]
-            if vaddr in mo:
-                return mo.data.val
-        return None
+        return self.support.get(vaddr)
 
     def to_dot(self, name=None, full=True):
         dot = "digraph G {\n"
@@ -30,6 +30,7 @@ Attributes:
 
             - 'url' allows to define the dialect and/or location of the database (default to sqlite)
             - 'log' indicates that database logging should be redirected to the amoco logging handlers
+            - 'cache' directory where analysis results (blocks, maps, cfgs) are saved (default '' disables the cache)
 
         - 'Log' which deals with logging options:
 
@@ -53,6 +54,7 @@ Attributes:
             - 'assemble' (unused)
             - 'format_x86' one of 'Intel' (default), 'ATT'
             - 'format_x64' one of 'Intel' (default), 'ATT'
+            - 'cache' directory where parsed ispecs and specs trees are saved (default '' disables the cache)
 """
 
 
@@ -69,9 +71,13 @@ class DB(Configurable):
     Attributes:
         url (str): defaults to sqlite:// (in-memory database).
         log (Bool): If True, merges database's logs into amoco loggers.
+        cache (str): directory of the analysis cache file, which allows to
+                     reuse decoded blocks, mappers and cfgs across sessions.
+                     Defaults to '' (cache disabled.)
     """
     url = Unicode("sqlite://", config=True)
     log = Bool(False, config=True)
+    cache = Unicode("", config=True)
 
 
 class Code(Configurable):
@@ -163,8 +169,12 @@ class Arch(Configurable):
         assemble (Bool): unused yet.
         format_x86 (str): select disassembly flavor: Intel (default) vs. AT&T (att).
         format_x64 (str): select disassembly flavor: Intel (default) vs. AT&T (att).
+        cache (str): directory of the ispecs cache file, which allows to skip
+                     parsing of spec formats when importing a cpu module.
+                     Defaults to '' (no cache file.)
     """
     assemble = Bool(False, config=True)
+    cache = Unicode("", config=True)
     format_x86 = Unicode("Intel", config=True)
 
     @observe("format_x86")
@@ -190,10 +200,16 @@ class System(Configurable):
         pagesize (int): provides the default memory page size in bytes.
         aslr (Bool): simulates ASLR if True. (not supported yet.)
         nx (Bool): unused.
+        icache (int): maximum number of decoded instructions memoized by
+                      each task (0 disables the instructions cache.)
+        fscache (int): maximum number of decoded inodes and cylinder groups
+                      kept by a filesystem reader.
     """
     pagesize = Integer(4096, config=True)
     aslr = Bool(False, config=True)
     nx = Bool(False, config=True)
+    icache = Integer(4096, config=True)
+    fscache = Integer(1024, config=True)
 
 
 class Config(object):
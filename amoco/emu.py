@@ -14,7 +14,10 @@ The emu module of amoco.
 # published under GPLv2 license
 
 from amoco.config import conf
-from amoco.arch.core import DecodeError
+from amoco.arch.core import DecodeError, type_control_flow
+from amoco.cas.mapper import mapper
+from amoco.cas.expressions import mem, locations_of
+from amoco.code import block
 from amoco.logger import Log
 
 logger = Log(__name__)
@@ -29,6 +32,7 @@ class emul(object):
         self.psz = self.pc.size
         self.hooks = []
         self.handlers = {}
+        self.tbcache = {}
         if task.OS is not None:
             self.abi = task.OS.abi
         else:
@@ -43,6 +47,62 @@ class emul(object):
             raise DecodeError(addr)
         return i
 
+    def stepb(self):
+        """execute the basic block at current pc address and return it.
+        Blocks are decoded once and kept in the tbcache along with their
+        compiled semantics (see :func:`compile_block`). A cached block is
+        used only if its bytes still match the current memory content.
+        """
+        addr = self.task.getx(self.pc)
+        tb = self.tbcache.get(addr, None)
+        if tb is not None:
+            b, raw, run = tb
+            try:
+                data = self.task.state.mmap.read(addr, len(raw))
+            except MemoryError:
+                data = None
+            # a written code page is read as several raw parts:
+            if data and all(isinstance(x, (bytes, memoryview)) for x in data):
+                data = b"".join(bytes(x) for x in data)
+            if data != raw:
+                tb = None
+        if tb is None:
+            b = self.translate(addr)
+            try:
+                run = compile_block(b.instr, self.cpu.get_data_endian())
+            except Exception as e:
+                logger.verbose("block %s not compiled (%s)" % (b.address, e))
+                run = None
+            self.tbcache[addr] = (b, b.raw(), run)
+        if run is None or not run(self.task.state):
+            # execute instructions one by one:
+            for i in b.instr:
+                self.task.state.safe_update(i)
+        return b
+
+    def translate(self, addr):
+        "decode the basic block at given address"
+        l = []
+        delayed = False
+        while True:
+            try:
+                i = self.task.read_instruction(addr)
+            except MemoryError:
+                if len(l) == 0:
+                    raise
+                i = None
+            if i is None:
+                break
+            l.append(i)
+            addr += i.length
+            if i.misc["delayed"]:
+                delayed = True
+            elif i.type == type_control_flow or delayed:
+                break
+        if len(l) == 0:
+            raise DecodeError(addr)
+        return block(l)
+
     def iterate(self):
         lasti = None
         while True:
@@ -56,6 +116,21 @@ class emul(object):
                 if not self.exception_handler(e):
                     break
 
+    def iterblocks(self):
+        "iterator over executed blocks (hooks get the last instruction)"
+        lasti = None
+        while True:
+            if not self.checkstate(lasti):
+                break
+            try:
+                b = self.stepb()
+                lasti = b.instr[-1]
+                yield b
+            except MemoryError as e:
+                lasti = None
+                if not self.exception_handler(e):
+                    break
+
     def exception_handler(self, e):
         te = type(e)
         logger.debug("exception %s received" % te)
@@ -70,3 +145,56 @@ class emul(object):
             if not res:
                 break
         return res
+
+
+def compile_block(instr, endian=1):
+    """Compute the mapper of the given list of instructions and return
+    a function that applies it to a mapper m in one call, returning True,
+    or returns False (and leaves m untouched) if the block can not be safely
+    applied, i.e. if a memory location read by the block may overlap a
+    location written by it, or if an address is not concrete.
+    """
+    bm = mapper(instr)
+    if bm.conds:
+        raise ValueError("conditional mapper")
+    R, W, X = [], [], []
+    for loc, v in bm:
+        if loc._is_ptr:
+            W.append((loc, v))
+            X.append(loc.base)
+        else:
+            R.append((loc, v))
+        X.append(v)
+    # collect all memory inputs:
+    I = []
+    while X:
+        for x in locations_of(X.pop()):
+            if x._is_mem:
+                I.append(x)
+                X.append(x.a.base)
+            elif x._is_ptr:
+                X.append(x.base)
+
+    def run(m):
+        mm = m.mmap
+        try:
+            rd = [(mm.reference(m(x.a)), x.length) for x in I]
+            wr = [(m(loc), v.size, m(v)) for loc, v in W]
+            wref = [(mm.reference(a), sz // 8) for a, sz, _ in wr]
+        except MemoryError:
+            return False
+        for (r, o), l in wref:
+            if r is not None:
+                return False
+            for (rr, oo), ll in rd:
+                if rr is not None or (oo < o + l and o < oo + ll):
+                    return False
+        rv = [(loc, m(v)) for loc, v in R]
+        for a, sz, v in wr:
+            m[mem(a, sz, endian=endian)] = v
+        for loc, v in rv:
+            m[loc] = v
+        return True
+
+    return run
+
@@ -14,6 +14,7 @@ The backward module of amoco implements backward CFG recovery strategies.
 # published under GPLv2 license
 
 from .forward import *
+from amoco.cas.expressions import mem
 from amoco.logger import Log
 
 logger = Log(__name__)
@@ -35,6 +36,36 @@ class fbackward(lforward):
     """
 
     policy = {"depth-first": True, "branch-lazy": False, "frame-aliasing": False}
+    summaries = None
+
+    def iterspool(self):
+        self.summaries = {}
+        return super(fbackward, self).iterspool()
+
+    def pcpath(self, n, x):
+        """Returns the evaluation of expression x by the map of node n where
+        the program counter is the address of n. Each evaluation step is
+        memoized by (node, structural key of x) in :attr:`summaries` (for the
+        component of n, reset at every run of the analysis) so that a step
+        of a *first-parent* path shared by several nodes costs a lookup
+        rather than a map evaluation. Entries of a node are invalidated
+        when its map changes (ie. when the node is cut.) The returned
+        expression is shared by the memo and must not be modified.
+        """
+        if self.summaries is None:
+            self.summaries = {}
+        S = self.summaries.get(n.c, None)
+        if S is None:
+            S = self.summaries[n.c] = {}
+        m = n.map
+        k = (n, x._hkey())
+        r = S.get(k, None)
+        if r is not None and r[0] is m:
+            return r[1]
+        pc = self.prog.cpu.PC()
+        y = m.use((pc, n.data.address))(x)
+        S[k] = (m, y)
+        return y
 
     def get_targets(self, node, parent):
         """Computes expression of target address in the given node, based
@@ -55,9 +86,10 @@ class fbackward(lforward):
         pc = self.prog.cpu.PC()
         n = node
         mpc = pc
-        while True:
-            m = n.data.map.use((pc, n.data.address))
-            mpc = m(mpc)
+        path = set()
+        while n not in path:
+            path.add(n)
+            mpc = self.pcpath(n, mpc)
             T = target(mpc, node).expand()
             if len(T) > 0:
                 return T
@@ -67,11 +99,11 @@ class fbackward(lforward):
                 break  # we are at function entry node
         # create func nodes:
         xpc = []
-        if n.data.misc[code.tag.FUNC_START]:
-            if node.data.misc[code.tag.FUNC_END]:
-                n.data.misc[code.tag.FUNC_START] += 1
+        if n.misc[code.tag.FUNC_START]:
+            if node.misc[code.tag.FUNC_END]:
+                n.misc[code.tag.FUNC_START] += 1
             try:
-                fsym = n.data.misc["callers"][0].data.misc["to"].ref
+                fsym = n.misc["callers"][0].misc["to"].ref
             except (IndexError, TypeError, AttributeError):
                 fsym = "f"
             func = code.func(n.c)
@@ -84,14 +116,18 @@ class fbackward(lforward):
                 )
                 logger.verbose("pc is memory aliased in %s %s" % (str(func), pol))
                 if self.policy["frame-aliasing"] == False:
-                    mpc.mods = []
-            func.map[pc] = mpc
-            for cn in n.data.misc["callers"]:
-                cnpc = cn.data.map.use((pc, cn.data.address))(mpc)
+                    # mpc is memoized by pcpath, strip mods of a copy:
+                    a = mpc.a
+                    mpc = mem(a.base, mpc.size, a.seg, a.disp, endian=mpc.endian)
+            fmap = mapper()
+            fmap[pc] = mpc
+            for cn in n.misc["callers"]:
+                cnpc = cn.map.use((pc, cn.data.address))(mpc)
                 f = cfg.node(func)
+                f._map = fmap
                 e = cn.c.add_edge(cfg.link(cn, f))
                 xpc.extend(target(cnpc, e.v[1]).expand())
-            n.data.misc["func"] = func
+            n.misc["func"] = func
         else:
             xpc.extend(target(mpc, node).expand())
         return xpc
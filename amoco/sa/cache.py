@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+"""
+.. _cache:
+
+cache.py
+========
+The cache module of amoco implements a content-hash keyed store of analysis
+results (:class:`AnalysisCache`) that is consulted by analysis classes
+(see :class:`lsweep`) before decoding or lifting instructions:
+
+* decoded blocks and their :class:`mapper` are keyed by the SHA-256 of the
+  architecture, address and raw bytes of the block,
+* recovered cfgs are keyed by the SHA-256 of the program's file together
+  with the architecture, analysis class, policy and start address.
+
+A cached block is located by its address and is used only if the bytes
+currently mapped at this address match its raw bytes. When conf.DB.cache
+names a directory, the cache is loaded from and saved to a file in this
+directory so that results are shared by all sessions and processes.
+In this file, instructions, maps and edges conditions are pickled with
+registers and external symbols by reference (see :mod:`system.snapshot`)
+and are unpickled with the cpu of the program on first access.
+"""
+
+# This code is part of Amoco
+# Copyright (C) 2021 Axel Tillequin (bdcht3@gmail.com)
+# published under GPLv2 license
+
+import hashlib
+import importlib
+import os
+import pickle
+
+from amoco.config import conf
+from amoco.logger import Log
+
+logger = Log(__name__)
+logger.debug("loading module")
+
+from amoco import cfg
+from amoco import code
+from amoco.system import snapshot
+from amoco.system.core import icopy
+from amoco.system.utils import filehash
+
+try:
+    with open(__file__, "rb") as _f:
+        CACHE_VERSION = hashlib.sha256(_f.read()).hexdigest()[:16]
+except (OSError, NameError):
+    CACHE_VERSION = None
+
+
+class AnalysisCache(object):
+    """
+    Store of decoded blocks, mappers and cfgs summaries.
+
+    Arguments:
+        path (Optional[str]): directory of the cache file (defaults to
+            conf.DB.cache, the cache is kept in memory only if empty.)
+
+    Attributes:
+        index (dict): lists of blocks digests by (arch, address).
+        blocks (dict): [raw, instr, map, cpu] entries by digest.
+        cfgs (dict): (V, E, cpu) cfgs summaries by digest of the analysis.
+        dirty (bool): True if the cache has been updated since last save.
+    """
+
+    __slots__ = ["path", "index", "blocks", "cfgs", "files", "dirty"]
+
+    def __init__(self, path=None):
+        if path is None:
+            path = conf.DB.cache
+        self.path = path or None
+        self.index = {}
+        self.blocks = {}
+        self.cfgs = {}
+        self.files = {}
+        self.dirty = False
+        if self.path:
+            self.load()
+
+    @property
+    def filename(self):
+        if self.path and CACHE_VERSION:
+            d = os.path.expanduser(self.path)
+            return os.path.join(d, "analysis-%s.pickle" % CACHE_VERSION)
+        return None
+
+    def load(self):
+        "merges the content of the cache file in this cache"
+        f = self.filename
+        try:
+            with open(f, "rb") as fd:
+                c = pickle.load(fd)
+        except (TypeError, OSError, EOFError, pickle.UnpicklingError):
+            logger.verbose("no valid analysis cache file %s" % f)
+            return
+        for k, v in c["index"].items():
+            l = self.index.setdefault(k, [])
+            l.extend(d for d in v if d not in l)
+        for d, e in c["blocks"].items():
+            self.blocks.setdefault(d, e)
+        for d, e in c["cfgs"].items():
+            self.cfgs.setdefault(d, e)
+
+    def save(self):
+        "saves this cache in its file if it has been updated"
+        f = self.filename
+        if f is None or not self.dirty:
+            return
+        # merge entries saved by other processes:
+        self.load()
+        c = {"index": self.index, "blocks": {}, "cfgs": {}}
+        try:
+            for d, (raw, instr, m, cpu) in self.blocks.items():
+                e = [raw, _encode(instr, cpu), _encode(m, cpu), cpu]
+                c["blocks"][d] = e
+            for k, (V, E, cpu) in self.cfgs.items():
+                c["cfgs"][k] = (V, _encode(E, cpu), cpu)
+        except (ImportError, pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning("can't save analysis cache file %s (%s)" % (f, e))
+            return
+        # write to a temporary file first to allow concurrent processes:
+        tmp = "%s.%d" % (f, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(f), exist_ok=True)
+            with open(tmp, "wb") as fd:
+                pickle.dump(c, fd, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, f)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning("can't save analysis cache file %s (%s)" % (f, e))
+        else:
+            self.dirty = False
+
+    @staticmethod
+    def arch(prog):
+        "returns the architecture key of the program's cpu"
+        dis = prog.cpu.disassemble
+        return (prog.cpu.__name__, dis.iset(), dis.endian())
+
+    def digest(self, prog, address, raw):
+        "returns the SHA-256 digest of the block at address with given raw bytes"
+        h = hashlib.sha256(repr((self.arch(prog), address)).encode())
+        h.update(raw)
+        return h.digest()
+
+    def _entry(self, prog, b):
+        e = self.blocks.get(self.digest(prog, b.address.value, b.raw()), None)
+        return _decoded(e, prog)
+
+    @staticmethod
+    def match(prog, address, raw):
+        "checks that raw bytes are currently mapped at address"
+        try:
+            data = prog.state.mmap.read(address, len(raw))
+        except MemoryError:
+            return False
+        return all(isinstance(x, bytes) for x in data) and b"".join(data) == raw
+
+    def getblock(self, prog, address):
+        """
+        returns a new block with copies of the cached instructions located at
+        address if they match the bytes currently mapped at this address,
+        or None.
+        """
+        for d in self.index.get((self.arch(prog), address), ()):
+            e = self.blocks[d]
+            if self.match(prog, address, e[0]):
+                return code.block([icopy(i) for i in _decoded(e, prog)[1]])
+        return None
+
+    def putblock(self, prog, b):
+        "adds the instructions of block b in the cache"
+        address = b.address.value
+        raw = b.raw()
+        d = self.digest(prog, address, raw)
+        if d not in self.blocks:
+            I = [icopy(i) for i in b.instr]
+            self.blocks[d] = [raw, I, None, prog.cpu.__name__]
+            self.index.setdefault((self.arch(prog), address), []).append(d)
+            self.dirty = True
+        return d
+
+    def getmap(self, prog, b):
+        "returns a copy of the cached mapper of block b, or None"
+        e = self._entry(prog, b)
+        return _mcopy(e[2]) if e is not None else None
+
+    def putmap(self, prog, b, m):
+        "adds the mapper m of block b in the cache"
+        d = self.putblock(prog, b)
+        e = self.blocks[d]
+        if e[2] is None and m is not None:
+            e[2] = m
+            self.dirty = True
+
+    def analysis(self, z, loc=None):
+        """
+        returns the digest of the analysis z (class, policy and start address)
+        of its program file, or None if the program file is not available.
+        """
+        p = z.prog
+        try:
+            f = p.bin.filename
+            st = os.stat(f)
+        except (AttributeError, TypeError, OSError):
+            return None
+        fk = (f, st.st_size, st.st_mtime)
+        fh = self.files.get(fk, None)
+        if fh is None:
+            fh = self.files[fk] = filehash(f)
+        if loc is not None and not isinstance(loc, int):
+            loc = loc.value if loc._is_cst else str(loc)
+        policy = sorted(getattr(z, "policy", {}).items())
+        k = (fh, self.arch(p), z.__class__.__name__, policy, loc)
+        return hashlib.sha256(repr(k).encode()).digest()
+
+    def getcfg(self, z, key):
+        """
+        adds the cached cfg with given analysis key in the graph of analysis z.
+        Returns True if the cfg was found, False otherwise.
+        """
+        S = self.cfgs.get(key, None)
+        if S is None:
+            return False
+        p = z.prog
+        V, E, cpu = S
+        for address, d, _ in V:
+            if not self.match(p, address, self.blocks[d][0]):
+                return False
+        if isinstance(E, bytes):
+            E = snapshot.loads(E, p.cpu, p.OS)
+            self.cfgs[key] = (V, E, cpu)
+        N = []
+        for address, d, misc in V:
+            _, instr, m, _ = _decoded(self.blocks[d], p)
+            n = cfg.node(code.block([icopy(i) for i in instr]))
+            n._map = _mcopy(m)
+            n.misc.update(misc)
+            N.append(n)
+        G = z.G
+        for n in N:
+            G.add_vertex(n)
+        for i, j, data in E:
+            G.add_edge(cfg.link(N[i], N[j], data=data))
+        logger.verbose("cfg restored from cache")
+        return True
+
+    def putcfg(self, z, key):
+        "adds a summary of the cfg of analysis z in the cache with given key"
+        p = z.prog
+        V = []
+        ix = {}
+        for c in z.G.C:
+            for n in c.sV:
+                if not n.data._is_block:
+                    logger.verbose("cfg with non-block nodes not cached")
+                    return
+                ix[n] = len(V)
+                misc = {
+                    k: v for (k, v) in n.misc.items() if isinstance(v, (int, str))
+                }
+                self.putmap(p, n.data, n._map)
+                d = self.digest(p, n.data.address.value, n.data.raw())
+                V.append((n.data.address.value, d, misc))
+        E = []
+        for c in z.G.C:
+            for e in c.sE:
+                E.append((ix[e.v[0]], ix[e.v[1]], e.data))
+        self.cfgs[key] = (V, E, p.cpu.__name__)
+        self.dirty = True
+
+
+def _mcopy(m):
+    return m.use() if m is not None else None
+
+
+def _encode(x, cpu):
+    "pickles x with registers of the cpu module (name) by reference"
+    if x is None or isinstance(x, bytes):
+        return x
+    return snapshot.dumps(x, importlib.import_module(cpu))
+
+
+def _decoded(e, prog):
+    "unpickles (in place) the instructions and map of a blocks entry"
+    if e is not None:
+        for i in (1, 2):
+            if isinstance(e[i], bytes):
+                e[i] = snapshot.loads(e[i], prog.cpu, prog.OS)
+    return e
+
+
+def default():
+    """
+    returns the process-wide analysis cache associated with conf.DB.cache,
+    or None if this parameter is empty.
+    """
+    global _default
+    if not conf.DB.cache:
+        return None
+    if _default is None or _default.path != conf.DB.cache:
+        _default = AnalysisCache(conf.DB.cache)
+    return _default
+
+
+_default = None
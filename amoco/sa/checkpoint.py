@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+"""
+.. _checkpoint:
+
+checkpoint.py
+=============
+The checkpoint module of amoco implements the saving (:func:`save`) and
+restoring (:func:`load`) of the state of a cfg recovery performed by a
+:class:`fforward`-based analysis, allowing to resume an interrupted
+:meth:`getcfg` (see its *checkpoint* argument.)
+
+The state is made of the graph's blocks with their maps and (simple) misc
+tags, the graph's edges and the spool of pending targets. It is pickled
+with registers and external symbols by reference (see :mod:`system.snapshot`)
+and compressed. A node that was being added when the checkpoint is taken
+is dropped and its target is put back in the spool so that the restored
+state is always consistent.
+
+A checkpoint also records the analysis class, the SHA-256 of the program
+and the start address of the recovery: it is not resumed if any of them
+differs.
+"""
+
+# This code is part of Amoco
+# Copyright (C) 2021 Axel Tillequin (bdcht3@gmail.com)
+# published under GPLv2 license
+
+import heapq
+import os
+import struct
+import zlib
+
+from amoco.logger import Log
+
+logger = Log(__name__)
+logger.debug("loading module")
+
+from amoco import cfg
+from amoco import code
+from amoco.system import snapshot
+from amoco.system.utils import filehash
+
+MAGIC = b"AMOCOCKP"
+VERSION = 2
+_header = struct.Struct("<8sII")
+
+
+class CheckpointError(Exception):
+    pass
+
+
+def progid(p):
+    "returns the SHA-256 hex digest of the program file (or bytes) of task p"
+    B = p.bin
+    try:
+        return filehash(B.filename)
+    except (AttributeError, TypeError, OSError):
+        pass
+    view = getattr(B, "view", None)
+    if view is not None:
+        return filehash(view)
+    return None
+
+
+def _loc(loc):
+    if loc is None or isinstance(loc, int):
+        return loc
+    return loc.value if loc._is_cst else str(loc)
+
+
+def _state(z, loc=None):
+    "returns the picklable state of the recovery performed by analysis z"
+    progress = getattr(z, "progress", None)
+    pending = progress[3] if progress else None
+    V = []
+    ix = {}
+    for n in z.G.V():
+        if n.data._is_block and n is not pending:
+            ix[n] = len(V)
+            V.append(n)
+    callers = []
+    for i, n in enumerate(V):
+        C = n.misc["callers"]
+        if C:
+            callers.append((i, [ix[c] for c in C if c in ix]))
+    V = [
+        (
+            n.data.instr,
+            {k: v for (k, v) in n.misc.items() if isinstance(v, (int, str))},
+            n._map,
+        )
+        for n in V
+    ]
+    E = [
+        (ix[e.v[0]], ix[e.v[1]], e.data)
+        for e in z.G.E()
+        if e.v[0] in ix and e.v[1] in ix
+    ]
+    wl = z.spool
+    ixp = lambda p: -1 if p is None else ix.get(p, None)
+    spool = []
+    for key, seq, t, func, depth in wl.heap:
+        i = ixp(t.parent)
+        if i is not None:
+            spool.append((key, seq, t.cst, i, t.econd, t.dirty, func, depth))
+    ids = {id(n): i for (n, i) in ix.items()}
+    ids[id(None)] = -1
+    seen = [(a, ids[pid]) for (a, pid) in wl.seen if pid in ids]
+    if progress is not None:
+        x, parent, econd, _ = progress
+        i = ixp(parent)
+        progress = (x, i, econd) if i is not None else None
+    return {
+        "analysis": z.__class__.__name__,
+        "prog": progid(z.prog),
+        "loc": _loc(loc),
+        "V": V,
+        "E": E,
+        "callers": callers,
+        "spool": spool,
+        "seen": seen,
+        "count": wl.count,
+        "total": wl.total,
+        "spent": wl.spent,
+        "fanin": wl.fanin,
+        "current": wl.current,
+        "progress": progress,
+    }
+
+
+def save(z, filename, loc=None):
+    """
+    writes the state of the cfg recovery of analysis z started at loc
+    in file filename. The analysis cache of z (if any) is saved as well.
+    """
+    data = zlib.compress(snapshot.dumps(_state(z, loc), z.prog.cpu))
+    tmp = "%s.%d" % (filename, os.getpid())
+    with open(tmp, "wb") as fd:
+        fd.write(_header.pack(MAGIC, VERSION, 0))
+        fd.write(data)
+    os.replace(tmp, filename)
+    if z.cache is not None:
+        z.cache.save()
+    logger.verbose("checkpoint saved in %s" % filename)
+
+
+def load(z, filename, loc=None):
+    """
+    restores the cfg (:attr:`G`) and spool of analysis z from the checkpoint
+    file filename, so that the recovery can be resumed with
+    :meth:`iterspool`. Raises :exc:`CheckpointError` if the checkpoint is
+    not a recovery of the same program by the same analysis from loc.
+    """
+    from amoco.sa.forward import target
+
+    with open(filename, "rb") as fd:
+        magic, version, _ = _header.unpack(fd.read(_header.size))
+        if magic != MAGIC or version != VERSION:
+            raise CheckpointError(filename)
+        data = fd.read()
+    p = z.prog
+    S = snapshot.loads(zlib.decompress(data), p.cpu, p.OS)
+    if S["analysis"] != z.__class__.__name__:
+        err = "%s: checkpoint of %s analysis" % (filename, S["analysis"])
+        raise CheckpointError(err)
+    if S["prog"] != progid(p):
+        raise CheckpointError("%s: checkpoint of another program" % filename)
+    if S["loc"] != _loc(loc):
+        err = "%s: checkpoint of recovery from %s" % (filename, S["loc"])
+        raise CheckpointError(err)
+    G = z.G
+    N = []
+    for instr, misc, m in S["V"]:
+        n = cfg.node(code.block(list(instr)))
+        n._map = m
+        n.misc.update(misc)
+        N.append(G.add_vertex(n))
+    for i, C in S["callers"]:
+        N[i].misc["callers"] = [N[j] for j in C]
+    for i, j, data in S["E"]:
+        G.add_edge(cfg.link(N[i], N[j], data=data))
+    node = lambda i: None if i < 0 else N[i]
+    wl = z.spool = z.new_spool()
+    for key, seq, x, i, econd, dirty, func, depth in S["spool"]:
+        t = target(x, node(i), econd)
+        t.dirty = dirty
+        wl.heap.append((key, seq, t, func, depth))
+    wl.seen = set((a, id(node(i))) for (a, i) in S["seen"])
+    wl.count = S["count"]
+    wl.total = S["total"]
+    wl.spent = S["spent"]
+    wl.fanin = S["fanin"]
+    wl.current = S["current"]
+    heapq.heapify(wl.heap)
+    if S["progress"] is not None:
+        # put the interrupted target back in the spool:
+        x, i, econd = S["progress"]
+        wl.push(target(x, node(i), econd), force=True)
+    logger.info(
+        "cfg recovery resumed with %d nodes and %d targets" % (G.order(), len(wl))
+    )
+    return z
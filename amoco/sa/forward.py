@@ -25,6 +25,10 @@ to assume that function calls always return to the *link address* of the call.
 # Copyright (C) 2006-2014 Axel Tillequin (bdcht3@gmail.com)
 # published under GPLv2 license
 
+import heapq
+import os
+import time
+
 from .lsweep import *
 from amoco.cas.mapper import mapper
 from amoco.logger import Log
@@ -106,6 +110,183 @@ class target(object):
 # -----------------------------------------------------------------------------
 
 
+def prio_none(wl, t, func, depth):
+    "no priority: targets are popped in LIFO or FIFO order only"
+    return 0
+
+
+def prio_function(wl, t, func, depth):
+    "targets of the least explored functions first"
+    return wl.spent.get(func, 0)
+
+
+def prio_depth(wl, t, func, depth):
+    "targets with the shortest path from their function's entry first"
+    return depth
+
+
+def prio_fanin(wl, t, func, depth):
+    """targets with the highest number of distinct parents first
+    (the key only decreases, the last target pushed to an address has its
+    current fan-in.)"""
+    return -wl.fanin.get(wl.address(t), 0)
+
+
+priorities = {
+    "depth-first": prio_none,
+    "breadth-first": prio_none,
+    "unexplored-function-first": prio_function,
+    "shortest-path": prio_depth,
+    "fan-in": prio_fanin,
+}
+
+
+class worklist(object):
+    """Scheduler of the :class:`target` objects to be explored during cfg
+    recovery (the *spool* of an analysis).
+
+    Targets are popped by increasing priority (see :data:`priorities`) and in
+    LIFO (or FIFO) order among equal priorities. The priority key of a
+    target is computed when it is pushed and computed again when it is
+    popped: a target whose key has grown meanwhile (eg. its function has
+    been explored further) is pushed back instead. A target that has already
+    been scheduled with the same address and parent is ignored.
+    Every target is associated with a function, the address of the last
+    target pushed without parent, from a calling parent or to one of the
+    known function entries, and with its depth from this function's entry.
+
+    Arguments:
+        priority (str|callable): the name of a priority in :data:`priorities`
+            or a function (wl, t, func, depth) that returns the priority key
+            of target t (defaults to None.)
+        lifo (bool): pop the last pushed target first among equal
+            priorities (defaults to True.)
+        budget (Optional[int]): maximum number of targets to pop.
+        fbudget (Optional[int]): maximum number of targets to pop for each
+            function.
+        entries (Optional[set]): addresses of known function entries.
+
+    Attributes:
+        spent (dict): the number of targets popped per function.
+        fanin (dict): the number of pushed targets per address.
+        current (tuple): the (func, depth) of the last popped target.
+    """
+
+    __slots__ = [
+        "heap",
+        "seen",
+        "count",
+        "prio",
+        "lifo",
+        "budget",
+        "fbudget",
+        "entries",
+        "total",
+        "spent",
+        "fanin",
+        "current",
+    ]
+
+    def __init__(self, priority=None, lifo=True, budget=None, fbudget=None, entries=None):
+        if priority is None:
+            priority = "depth-first" if lifo else "breadth-first"
+        if not callable(priority):
+            priority = priorities[priority]
+        self.prio = priority
+        self.lifo = lifo
+        self.budget = budget
+        self.fbudget = fbudget
+        self.entries = frozenset(entries or ())
+        self.heap = []
+        self.seen = set()
+        self.count = 0
+        self.total = 0
+        self.spent = {}
+        self.fanin = {}
+        self.current = (None, 0)
+
+    @staticmethod
+    def address(t):
+        "returns the address (or external reference) targeted by t, or None"
+        x = t.cst
+        if x is None:
+            return None
+        if x._is_cst:
+            return x.value
+        if x._is_ext:
+            return x.ref
+        return None
+
+    def push(self, t, force=False):
+        "adds target t unless it has already been scheduled (and not forced)"
+        a = self.address(t)
+        if a is not None:
+            k = (a, id(t.parent))
+            if k in self.seen and not force:
+                return False
+            self.seen.add(k)
+            self.fanin[a] = self.fanin.get(a, 0) + 1
+        func, depth = self.current
+        p = t.parent
+        if p is None or p.misc[code.tag.FUNC_CALL] or a in self.entries:
+            func, depth = a, 0
+        else:
+            depth += 1
+        self.count += 1
+        seq = -self.count if self.lifo else self.count
+        key = self.prio(self, t, func, depth)
+        heapq.heappush(self.heap, (key, seq, t, func, depth))
+        return True
+
+    append = push
+
+    def extend(self, T):
+        for t in T:
+            self.push(t)
+
+    def exhausted(self, func=None):
+        "checks if the global (or func) budget is spent"
+        if self.budget is not None and self.total >= self.budget:
+            return True
+        if func is not None and self.fbudget is not None:
+            return self.spent.get(func, 0) >= self.fbudget
+        return False
+
+    def pop(self, i=None):
+        """returns the next target to explore, or None if the budget is spent.
+        (The index argument is ignored, targets are popped by priority.)
+        """
+        while self.heap and not self.exhausted():
+            key, seq, t, func, depth = heapq.heappop(self.heap)
+            # refresh the key that was computed at push time:
+            k = self.prio(self, t, func, depth)
+            if k > key:
+                heapq.heappush(self.heap, (k, seq, t, func, depth))
+                continue
+            if self.exhausted(func):
+                logger.verbose("budget of function %s spent, %s dropped" % (func, t))
+                continue
+            self.total += 1
+            self.spent[func] = self.spent.get(func, 0) + 1
+            self.current = (func, depth)
+            return t
+        return None
+
+    def __len__(self):
+        if self.exhausted():
+            return 0
+        return len(self.heap)
+
+    def __iter__(self):
+        return (e[2] for e in self.heap)
+
+    def __repr__(self):
+        return "<worklist of %d targets>" % len(self.heap)
+
+
+# -----------------------------------------------------------------------------
+
+
 class fforward(lsweep):
     """The fast forward based analysis follows the :meth:`PC` expression evaluated
     within a single block only. Exploration goes forward until expressions
@@ -116,20 +297,47 @@ class fforward(lsweep):
         policy (dict): holds various useful parameters for the analysis.
 
                    * 'depth-first' : walk the graph with *depth-first* policy if True.
+                   * 'priority' : name of the :class:`worklist` priority \
+                           (see :data:`priorities`), or None.
+                   * 'budget' : maximum number of targets explored, or None.
+                   * 'func-budget' : maximum number of targets explored per \
+                           function, or None.
                    * 'branch-lazy' : proceed with linear sweep whenever the target \
                            expression does not evaluate to a constant address.
                    * 'frame-aliasing' : assume no pointer aliasing if False.
                    * 'complexity' : limit expressions complexity.
 
-        spool (list[target]): the list of current targets to extend the
+        spool (worklist): the scheduler of current targets to extend the
             :class:`cfg.graph`.
 
     """
 
-    policy = {"depth-first": True, "branch-lazy": True}
+    policy = {
+        "depth-first": True,
+        "branch-lazy": True,
+        "priority": None,
+        "budget": None,
+        "func-budget": None,
+    }
+    progress = None
+
+    def new_spool(self):
+        "returns a new empty :class:`worklist` defined by the policy"
+        P = self.policy
+        entries = None
+        if P.get("priority", None) or P.get("func-budget", None):
+            entries = getattr(self.prog.bin, "functions", None)
+        return worklist(
+            P.get("priority", None),
+            lifo=P["depth-first"],
+            budget=P.get("budget", None),
+            fbudget=P.get("func-budget", None),
+            entries=entries,
+        )
 
     def init_spool(self, loc):
-        self.spool = [target(loc, None)]
+        self.spool = self.new_spool()
+        self.spool.push(target(loc, None))
 
     def update_spool(self, vtx, parent):
         T = self.get_targets(vtx, parent)
@@ -225,7 +433,7 @@ class fforward(lsweep):
             return True
         return False
 
-    def getcfg(self, loc=None, debug=False):
+    def getcfg(self, loc=None, debug=False, checkpoint=None, interval=60.0):
         """The getcfg method is the cfg recovery method of any analysis
         class.
 
@@ -235,22 +443,60 @@ class fforward(lsweep):
             debug (bool): A python debugger :func:`set_trace()` call is
                 emitted at every node added to the cfg.
                 (Default to False.)
+            checkpoint (Optional[str]): the checkpoint file of the recovery
+                (see :mod:`sa.checkpoint`). If the file exists, the recovery
+                resumes from this checkpoint, which must be a checkpoint of
+                the same analysis of the program from loc.
+            interval (float): minimum delay in seconds between checkpoints.
+
+        If an analysis cache is available, the cfg is restored from the
+        cache when the same analysis of the same program has been done
+        before, and is otherwise added to the cache once recovered.
+        If a checkpoint file is given, the state of the recovery is saved
+        in this file periodically, when interrupted and when done.
         """
         if debug:
             import pdb
 
             pdb.set_trace()
+        key = None
+        if self.cache is not None:
+            key = self.cache.analysis(self, loc)
+            if key is not None and self.cache.getcfg(self, key):
+                return self.G
+        if checkpoint is None:
+            explore = self.itercfg(loc)
+        else:
+            from amoco.sa import checkpoint as ckpt
+
+            if os.path.isfile(checkpoint):
+                ckpt.load(self, checkpoint, loc)
+                explore = self.iterspool()
+            else:
+                explore = self.itercfg(loc)
+            due = time.monotonic() + interval
         try:
-            for x in self.itercfg(loc):
-                pass
+            for x in explore:
+                if checkpoint is not None and time.monotonic() >= due:
+                    ckpt.save(self, checkpoint, loc)
+                    due = time.monotonic() + interval
         except KeyboardInterrupt:
-            pass
+            key = None
+        if checkpoint is not None:
+            ckpt.save(self, checkpoint, loc)
+        if key is not None:
+            self.cache.putcfg(self, key)
+            self.cache.save()
         return self.G
 
     def itercfg(self, loc=None):
         """A generic *forward* analysis explorer. The default policy
         is *depth-first* search (use policy=0 for breadth-first search.)
+        Targets are scheduled by the :class:`worklist` spool and exploration
+        stops when its budget is spent, leaving a partial cfg.
         The ret instructions are not followed (see lbackward analysis).
+        Blocks and their maps are taken from (and added to) the analysis
+        cache, if any.
 
         Arguments:
             loc (Optional[cst]): the address to start the cfg recovery
@@ -259,23 +505,45 @@ class fforward(lsweep):
         Yields:
             :class:`cfg.node`: every nodes added to the graph.
         """
-        G = self.G
-        # spool is the list of targets (target_ instances) to be analysed
+        # spool is the worklist of targets (target_ instances) to be analysed
         self.init_spool(loc)
-        # order is the index to pop elements from spool
-        order = -1 if self.policy["depth-first"] else 0
+        for vtx in self.iterspool():
+            yield vtx
+
+    def iterspool(self):
+        """Explores the targets of the current spool (see :meth:`itercfg`).
+        The :attr:`progress` attribute holds the (address, parent, econd, pending)
+        tuple from which the exploration of the current target would resume,
+        where pending is the node being added to the graph, or is None
+        when the exploration is at a node boundary.
+
+        Yields:
+            :class:`cfg.node`: every nodes added to the graph.
+        """
+        G = self.G
+        cache = self.cache
+        self.progress = None
         # lazy is a flag to fallback to linear sweep
         lazy = self.policy["branch-lazy"]
         # proceed with exploration of every spool element:
         while len(self.spool) > 0:
-            t = self.spool.pop(order)
+            t = self.spool.pop()
+            if t is None:
+                break
             parent = t.parent
             econd = t.econd
+            self.progress = (t.cst, parent, econd, None)
             if self.check_ext_target(t):
+                self.progress = None
                 continue
             for b in self.iterblocks(loc=t.cst):
-                vtx = G.get_by_name(b.name) or cfg.node(b)
-                do_update = vtx not in G
+                vtx = cfg.node(b)
+                x = G.get_by_name(vtx.name)
+                do_update = x is None
+                vtx = x or vtx
+                self.progress = (b.address, parent, econd, vtx if do_update else None)
+                if do_update and cache is not None:
+                    vtx._map = cache.getmap(self.prog, b)
                 # if block is a FUNC_START, we add it as a new graph component (no link to parent),
                 # otherwise we add the new (parent,vtx) edge.
                 if parent is None:
@@ -292,13 +560,18 @@ class fforward(lsweep):
                 # now we try to populate spool with target addresses of current block:
                 if do_update:
                     self.update_spool(vtx, parent)
+                    if cache is not None:
+                        cache.putmap(self.prog, vtx.data, vtx._map)
                 self.check_func(vtx)
+                cont = do_update and lazy and not vtx.misc[code.tag.FUNC_END]
+                self.progress = (b.address + b.length, vtx, None, None) if cont else None
                 yield vtx
-                if not do_update or not lazy or vtx.misc[code.tag.FUNC_END]:
+                if not cont:
                     break
                 logger.verbose("lsweep fallback at %s" % vtx.data.address)
                 parent = vtx
                 econd = None
+            self.progress = None
 
 
 # -----------------------------------------------------------------------------
@@ -55,17 +55,26 @@ class lsweep(object):
               :class:`system.core.CoreExec` or to provide access to a cpu module
               and methods :meth:`initstate`, :meth:`read_instruction`,
               and :meth:`codehelper`.
+        cache (Optional[AnalysisCache]): the cache of analysis results
+              (see :mod:`sa.cache`) consulted before decoding blocks.
+              Defaults to the cache associated with conf.DB.cache, if any.
 
     Attributes:
         prog: (see arguments.)
         G (graph): the placeholder for the recovered :class:`cfg.graph`.
+        cache: (see arguments.)
     """
 
-    __slots__ = ["prog", "G"]
+    __slots__ = ["prog", "G", "cache"]
 
-    def __init__(self, prog):
+    def __init__(self, prog, cache=None):
         self.prog = prog
         self.G = cfg.graph()
+        if cache is None:
+            from amoco.sa.cache import default
+
+            cache = default()
+        self.cache = cache
         SIG_NODE.sender(self.G.add_vertex)
         SIG_EDGE.sender(self.G.add_edge)
 
@@ -90,7 +99,7 @@ class lsweep(object):
         while True:
             i = p.read_instruction(loc)
             if i is None:
-                raise StopIteration
+                return
             loc += i.length
             yield i
 
@@ -99,6 +108,8 @@ class lsweep(object):
         attribute is used to detect the end of a block (type_control_flow).
         The returned :class:`block` object is enhanced with plateform-specific
         informations (see :attr:`block.misc`).
+        If an analysis cache is available, blocks found in the cache at the
+        current address are not decoded again.
 
         Arguments:
             loc (Optional[cst]): the address of the first block
@@ -109,9 +120,22 @@ class lsweep(object):
             until :meth:`sequence` stops.
         """
         l = []
+        cache = self.cache
         seq = self.sequence(loc)
         is_delay_slot = False
-        for i in seq:
+        while True:
+            if cache is not None and not l and loc is not None and loc._is_cst:
+                b = cache.getblock(self.prog, loc.value)
+                if b is not None:
+                    SIG_BLCK.emit(args=b)
+                    yield b
+                    loc = loc + b.length
+                    seq = self.sequence(loc)
+                    continue
+            i = next(seq, None)
+            if i is None:
+                break
+            loc = i.address + i.length
             # add branching instruction inside block:
             l.append(i)
             if i.misc["delayed"]:
@@ -122,6 +146,8 @@ class lsweep(object):
                 b = code.block(l)
                 l = []
                 is_delay_slot = False
+                if cache is not None:
+                    cache.putblock(self.prog, b)
                 SIG_BLCK.emit(args=b)
                 yield b
         if len(l) > 0:
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+"""
+.. _parallel:
+
+parallel.py
+===========
+The parallel module of amoco implements a driver (:class:`parallel`) that
+distributes the cfg recovery of a program over a pool of worker processes.
+
+Function entry points (seeds) are obtained from the program's entrypoint,
+its symbols and optional prologue byte patterns. Each seed is explored by
+a worker with the selected analysis class (:class:`fforward` by default)
+that does not go beyond other seeds: targets that reach another seed are
+returned as cross-function links instead. All components are finally
+merged into a single :class:`cfg.graph` together with these links.
+
+Workers restore the program from a snapshot (see :mod:`system.snapshot`)
+rather than loading it again, and send back blocks, maps and links that
+reference registers and external symbols of the task by name.
+"""
+
+# This code is part of Amoco
+# Copyright (C) 2021 Axel Tillequin (bdcht3@gmail.com)
+# published under GPLv2 license
+
+import os
+import tempfile
+from multiprocessing import Pool
+
+from amoco.logger import Log
+
+logger = Log(__name__)
+logger.debug("loading module")
+
+from amoco import cfg
+from amoco import code
+from amoco.sa.forward import fforward
+from amoco.system import snapshot
+
+# ------------------------------------------------------------------------------
+
+
+class _bounded(object):
+    """
+    Mixin for analysis classes that stops the exploration at targets that
+    are other seeds, and records these targets as links in :attr:`calls`.
+    """
+
+    seed = None
+    seeds = frozenset()
+
+    def get_targets(self, node, parent):
+        T = []
+        for t in super(_bounded, self).get_targets(node, parent):
+            x = t.cst
+            if x is not None and x._is_cst and x.value in self.seeds:
+                if x.value != self.seed:
+                    self.calls.append((t.parent, x.value, t.econd))
+                    continue
+            T.append(t)
+        return T
+
+    def update_spool(self, vtx, parent):
+        n = len(self.calls)
+        super(_bounded, self).update_spool(vtx, parent)
+        # a node that only links to other seeds is not to be continued:
+        if len(self.calls) > n and vtx.misc["tbc"]:
+            del vtx.misc["tbc"]
+
+
+_worker = {}
+
+
+def _init(filename, cls, seeds):
+    p = snapshot.restore(filename)
+    _worker["prog"] = p
+    _worker["cls"] = type("bounded_%s" % cls.__name__, (_bounded, cls), {})
+    _worker["seeds"] = seeds
+
+
+def _summary(z):
+    "returns the (V, E, calls) summary of the graph recovered by z"
+    V = []
+    ix = {}
+    for n in z.G.V():
+        if n.data._is_block:
+            ix[n] = len(V)
+            misc = {k: v for (k, v) in n.misc.items() if isinstance(v, (int, str))}
+            V.append((n.data.instr, misc, n._map))
+    E = [(ix[e.v[0]], ix[e.v[1]], e.data) for e in z.G.E() if e.v[0] in ix and e.v[1] in ix]
+    calls = [(ix[n], a, econd) for (n, a, econd) in z.calls if n in ix]
+    return (V, E, calls)
+
+
+def _recover(seed):
+    "worker task: recovers the cfg component(s) from the given seed address"
+    p = _worker["prog"]
+    seeds = _worker["seeds"]
+    z = _worker["cls"](p)
+    z.seed = seed
+    z.seeds = seeds
+    z.calls = []
+    # cached cfgs depend on the set of seeds:
+    z.policy = dict(z.policy, seeds=hash(seeds))
+    try:
+        z.getcfg(p.cpu.cst(seed, p.cpu.PC().size))
+    except Exception as e:
+        logger.warning("recovery failed at %#x (%s)" % (seed, e))
+        return (seed, "%s: %s" % (e.__class__.__name__, e))
+    return (seed, snapshot.dumps(_summary(z), p.cpu))
+
+
+# ------------------------------------------------------------------------------
+
+
+class parallel(object):
+    """Parallel cfg recovery driver.
+
+    Arguments:
+        prog: the program (task) to analyze.
+        analysis: the analysis class used by each worker (fforward by default.)
+        processes (Optional[int]): the number of worker processes (defaults to
+            the number of cpus.)
+
+    Attributes:
+        prog, analysis, processes: (see arguments.)
+        G (graph): the placeholder for the merged :class:`cfg.graph`.
+        failed (dict): the error messages of seeds whose recovery failed
+            (the merged graph is then incomplete.)
+    """
+
+    __slots__ = ["prog", "analysis", "processes", "G", "failed"]
+
+    def __init__(self, prog, analysis=fforward, processes=None):
+        self.prog = prog
+        self.analysis = analysis
+        self.processes = processes or os.cpu_count()
+        self.G = cfg.graph()
+        self.failed = {}
+
+    def seeds(self, prologues=None):
+        """returns the sorted list of function entry addresses found from the
+        program's entrypoint, its function symbols and occurences of the
+        given prologues regular expressions (bytes) in mapped memory.
+        """
+        p = self.prog
+        S = set()
+        try:
+            pc = p.state(p.cpu.PC())
+            if pc._is_cst:
+                S.add(pc.value)
+        except (TypeError, ValueError):
+            pass
+        F = getattr(p.bin, "functions", None) or {}
+        S.update(a for a in F if isinstance(a, int))
+        for pattern in prologues or ():
+            S.update(p.state.mmap.grep(pattern))
+        # keep only addresses mapped with raw bytes:
+        res = []
+        for a in sorted(S):
+            try:
+                data = p.state.mmap.read(a, 1)
+            except MemoryError:
+                continue
+            if data and isinstance(data[0], bytes):
+                res.append(a)
+        return res
+
+    def getcfg(self, seeds=None, prologues=None):
+        """recovers the cfg from all seeds (see :meth:`seeds`) in parallel
+        and returns the merged graph. Seeds whose recovery failed are
+        reported in :attr:`failed`.
+        """
+        if seeds is None:
+            seeds = self.seeds(prologues)
+        seeds = frozenset(seeds)
+        fd, filename = tempfile.mkstemp(suffix=".snap")
+        os.close(fd)
+        try:
+            snapshot.save(self.prog, filename)
+            # seeds are sent once to every worker rather than with each task:
+            with Pool(self.processes, _init, (filename, self.analysis, seeds)) as pool:
+                R = pool.map(_recover, sorted(seeds))
+        finally:
+            os.remove(filename)
+        self.merge(R)
+        return self.G
+
+    def merge(self, results):
+        """merges the (seed, summary) results of workers into :attr:`G`,
+        including links to other seeds. Error messages (str) results are
+        recorded in :attr:`failed` instead.
+        Blocks of all components are added first, so that a block cut by
+        one worker also cuts the same (uncut) block of another worker.
+        The out-links of a block are then attached to the node that ends
+        where this block ends.
+        """
+        p = self.prog
+        G = self.G
+        roots = {}
+        calls = []
+        parts = []
+        for seed, data in results:
+            if isinstance(data, str):
+                self.failed[seed] = data
+                continue
+            V, E, C = snapshot.loads(data, p.cpu, p.OS)
+            N = []
+            for instr, misc, m in V:
+                b = code.block(instr)
+                end = b.address.value + b.length
+                n = G.get_by_name(cfg.node(b).name)
+                if n is None:
+                    n = G.add_vertex(cfg.node(b))
+                    n.misc.update(misc)
+                    # the map is kept only if the block was not cut:
+                    if n.data is b and b.address.value + b.length == end:
+                        n._map = m
+                N.append((n, end))
+            parts.append((seed, N, E, C))
+        for seed, N, E, C in parts:
+            T = [self._tail(n, end) for (n, end) in N]
+            for n, _ in N:
+                if n.data.address == seed:
+                    roots[seed] = n
+            for i, j, econd in E:
+                G.add_edge(cfg.link(T[i], N[j][0], data=econd))
+            calls.extend((T[i], a, econd) for (i, a, econd) in C)
+        for n, a, econd in calls:
+            r = roots.get(a, None)
+            if r is not None:
+                G.add_edge(cfg.link(n, r, data=econd))
+        if self.failed:
+            logger.warning("cfg recovery failed for %d seeds" % len(self.failed))
+        return G
+
+    def _tail(self, n, end):
+        """returns the last node of the chain of contiguous nodes that starts
+        at node n and ends at address end, linking these nodes if needed.
+        """
+        G = self.G
+        a = n.data.address.value + len(n)
+        while a < end:
+            x = G.support.get(a)
+            if x is None or x.data.address.value != a:
+                break
+            if n.e_to(x) is None:
+                G.add_edge(cfg.link(n, x))
+            n = x
+            a += len(x)
+        return n
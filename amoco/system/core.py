@@ -14,8 +14,15 @@ the :mod:`amoco.system` package.
 
 """
 
+import copy
+import importlib
+import mmap
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
 from amoco.arch.core import Bits
 
+from amoco.config import conf
 from amoco.logger import Log
 
 logger = Log(__name__)
@@ -24,6 +31,30 @@ logger.debug("loading module")
 # ------------------------------------------------------------------------------
 
 
+def icopy(i):
+    """
+    returns a copy of instruction i with its own misc dict and operands.
+    Registers and external symbols are shared, other operands are copied
+    (with the address of memory operands.)
+    """
+    j = copy.copy(i)
+    j.misc = i.misc.copy()
+    for k, v in j.misc.items():
+        if isinstance(v, list):
+            j.misc[k] = list(v)
+    j.operands = [_opcopy(o) for o in i.operands]
+    return j
+
+
+def _opcopy(o):
+    if getattr(o, "_is_reg", True) or o._is_ext:
+        return o
+    c = copy.copy(o)
+    if o._is_mem:
+        c.a = copy.copy(o.a)
+    return c
+
+
 class CoreExec(object):
     """
     This class implements the base class for Task(s).
@@ -48,15 +79,20 @@ class CoreExec(object):
              of the executable program, including mapping of registers as well
              as the :class:`MemoryMap` instance that represents the virtual
              memory of the program.
+
+        icache: a bounded LRU dict of already decoded instructions, keyed by
+             address, disassembler mode and keyword arguments (see
+             :meth:`read_instruction`). Its size is given by conf.System.icache.
     """
 
-    __slots__ = ["bin", "cpu", "OS", "state"]
+    __slots__ = ["bin", "cpu", "OS", "state", "icache"]
 
     def __init__(self, p, cpu=None):
         self.bin = p
         self.cpu = cpu
         self.OS = None
         self.state = self.initstate()
+        self.icache = OrderedDict()
 
     def __repr__(self):
         c = self.__class__.__name__
@@ -81,15 +117,25 @@ class CoreExec(object):
         """
         fetch instruction at virtual address vaddr, returned as an
         cpu.instruction instance or None.
+        Decoded instructions are memoized in the icache, and a cached
+        instruction is returned only if its bytes still match the bytes
+        currently mapped at vaddr, so that memory writes that overlap a
+        cached instruction invalidate its entry. The returned instruction
+        is always a copy (see :func:`icopy`) of the cached one so that it
+        can be tagged or modified by the caller.
         """
         if self.cpu is None:
             logger.error("no cpu imported")
             raise ValueError
-        maxlen = self.cpu.disassemble.maxlen
+        dis = self.cpu.disassemble
+        maxlen = dis.maxlen
         if isinstance(vaddr, int):
             addr = self.cpu.cst(vaddr, self.cpu.PC().size)
         else:
             addr = vaddr
+        key = None
+        if addr._is_cst and conf.System.icache > 0:
+            key = (addr.value, dis.iset(), dis.endian(), tuple(sorted(kargs.items())))
         try:
             istr = self.state.mmap.read(vaddr, maxlen)
         except MemoryError as e:
@@ -99,7 +145,19 @@ class CoreExec(object):
             if len(istr) <= 0 or not isinstance(istr[0], bytes):
                 logger.verbose("failed to read instruction at %s" % addr)
                 return None
-        i = self.cpu.disassemble(istr[0], **kargs)
+            # join raw bytes of contiguous mapped objects:
+            while len(istr) > 1 and isinstance(istr[1], bytes):
+                istr[0:2] = [istr[0] + istr[1]]
+        if key is not None:
+            try:
+                i = self.icache.pop(key, None)
+            except TypeError:
+                # unhashable kargs:
+                key = i = None
+            if i is not None and istr[0].startswith(i.bytes):
+                self.icache[key] = i
+                return icopy(i)
+        i = dis(istr[0], **kargs)
         if i is None:
             logger.warning("disassemble failed at vaddr %s" % addr)
             return None
@@ -110,8 +168,77 @@ class CoreExec(object):
             if xsz > 0:
                 xdata = self.state.mmap.read(vaddr + i.length, xsz)
                 i.xdata(i, xdata)
+            elif key is not None:
+                self.icache[key] = i
+                if len(self.icache) > conf.System.icache:
+                    self.icache.popitem(last=False)
+                return icopy(i)
             return i
 
+    def disassemble_range(self, vaddr, end=None, **kargs):
+        """
+        iterator over instructions linearly decoded from virtual address
+        vaddr until address end (defaults to the end of mapped memory) or
+        until no instruction can be decoded.
+        Raw bytes of the memory map are read directly from the mapped
+        objects (see :meth:`disassembler.disassemble_range`) rather than
+        with one memory map read per instruction. Only instructions that
+        overlap two mapped objects are fetched with :meth:`read_instruction`.
+        """
+        if self.cpu is None:
+            logger.error("no cpu imported")
+            raise ValueError
+        dis = self.cpu.disassemble
+        psz = self.cpu.PC().size
+        z = self.state.mmap._zones[None]
+        if not isinstance(vaddr, int):
+            vaddr = vaddr.value
+        while end is None or vaddr < end:
+            k = z.locate(vaddr)
+            o = z._map[k] if k is not None else None
+            if o is not None and o.data._is_raw and (vaddr in o):
+                stop = o.end
+                # keep a full window for instructions at mapped objects boundary:
+                if k + 1 < len(z._map) and z._map[k + 1].vaddr == stop:
+                    stop -= dis.maxlen - 1
+                if end is not None:
+                    stop = min(stop, end)
+                if vaddr < stop:
+                    buf = memoryview(o.data.val)[vaddr - o.vaddr :]
+                    for i in dis.disassemble_range(buf, vaddr, stop, **kargs):
+                        vaddr += i.length
+                        i.address = self.cpu.cst(i.address, psz)
+                        yield i
+                if end is not None and vaddr >= end:
+                    break
+            try:
+                i = self.read_instruction(vaddr, **kargs)
+            except MemoryError:
+                i = None
+            if i is None:
+                break
+            vaddr += i.length
+            yield i
+
+    def check_sym(self, target):
+        """
+        returns a label expression for the binary format symbol located
+        exactly at target address (int or cst), or None.
+        """
+        if isinstance(target, int):
+            addr, size = target, self.cpu.PC().size
+        elif target._is_cst:
+            addr, size = target.value, target.size
+        else:
+            return None
+        try:
+            name, offset = self.bin.getsymbol(addr)
+        except (AttributeError, TypeError):
+            return None
+        if offset != 0:
+            return None
+        return self.cpu.lab(name, size=size)
+
     def getx(self, loc, size=8, sign=False):
         """
         high level method to get the expressions value associated
@@ -225,11 +352,59 @@ class DefineStub(object):
 
 # ------------------------------------------------------------------------------
 
+class AddressIndex(object):
+    """
+    Sorted index of address intervals [start, stop) associated with some
+    objects, where the object that contains a given address is located
+    by bisection. Intervals are provided as (start, stop, obj) tuples and
+    overlapping intervals take precedence over previous ones.
+    """
+
+    __slots__ = ["bounds", "items"]
+
+    def __init__(self, intervals=()):
+        bounds = set()
+        intervals = [x for x in intervals if x[0] < x[1]]
+        for sta, sto, _ in intervals:
+            bounds.add(sta)
+            bounds.add(sto)
+        self.bounds = sorted(bounds)
+        self.items = [None] * len(self.bounds)
+        for sta, sto, obj in intervals:
+            i = bisect_left(self.bounds, sta)
+            j = bisect_left(self.bounds, sto, i)
+            self.items[i:j] = [(sta, obj)] * (j - i)
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def locate(self, addr):
+        "returns (start, obj) of the interval that contains addr, or None"
+        i = bisect_right(self.bounds, addr) - 1
+        if i < 0:
+            return None
+        return self.items[i]
+
+    def range(self, start, stop):
+        "iterator over (start, obj) of intervals that overlap [start, stop)"
+        i = max(bisect_right(self.bounds, start) - 1, 0)
+        j = bisect_left(self.bounds, stop)
+        last = None
+        for x in self.items[i:j]:
+            if x is not None and x is not last:
+                yield x
+            last = x
+
+
 class BinFormat(object):
     """
     Base class for binary format API, just to define default attributes
     and recommended properties. See elf.py, pe.py and macho.py for example of
     child classes.
+
+    Sections/segments and symbols are indexed by address on first use (see
+    :class:`AddressIndex`) so that :meth:`getsection`, :meth:`getsymbol`
+    and :meth:`getaddress` do not scan the binary format tables.
     """
     is_ELF = False
     is_PE = False
@@ -240,6 +415,56 @@ class BinFormat(object):
     reltab = None
     functions = None
     variables = None
+    _sections_index = None
+    _symbols_index = None
+
+    def _sections(self):
+        "returns the (start, stop, section) mapped intervals"
+        return []
+
+    def getsection(self, addr):
+        "returns the section/segment that contains addr, or None"
+        if self._sections_index is None:
+            self._sections_index = AddressIndex(self._sections())
+        r = self._sections_index.locate(addr)
+        return r[1] if r is not None else None
+
+    def _symbols(self):
+        index = []
+        names = {}
+        for D in (self.functions, self.variables):
+            for a, v in (D or {}).items():
+                if isinstance(v, tuple):
+                    name, size = v[0], v[1]
+                else:
+                    name, size = str(v), 0
+                index.append((a, a + max(size, 1), name))
+                names.setdefault(name, a)
+        # functions take precedence over variables:
+        index.reverse()
+        self._symbols_index = (AddressIndex(index), names)
+        return self._symbols_index
+
+    def getsymbol(self, addr):
+        """
+        returns (name, offset) of the function or variable symbol that
+        contains addr, or None.
+        """
+        index, _ = self._symbols_index or self._symbols()
+        r = index.locate(addr)
+        if r is None:
+            return None
+        return (r[1], addr - r[0])
+
+    def getsymbols(self, start, stop):
+        "returns the list of (address, name) of symbols overlapping [start, stop)"
+        index, _ = self._symbols_index or self._symbols()
+        return list(index.range(start, stop))
+
+    def getaddress(self, name):
+        "returns the address of the function or variable symbol name, or None"
+        _, names = self._symbols_index or self._symbols()
+        return names.get(name, None)
 
     @property
     def entrypoints(self):
@@ -258,17 +483,31 @@ class DataIO(BinFormat):
     This class simply wraps a binary file or a bytes string and implements
     both the file and bytes interface. It allows an input to be provided as
     files of bytes and manipulated as either a file or a bytes object.
+    Bytes strings and regular files (which are memory-mapped read-only) are
+    also exposed as a memoryview in the view attribute, so that slices of
+    the data can be obtained without copy.
     """
 
     def __init__(self, f):
+        self.view = None
         if isinstance(f, bytes):
             from io import BytesIO
 
             self.f = BytesIO(f)
+            self.view = memoryview(f)
         else:
             self.f = f
+            try:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (AttributeError, OSError, ValueError):
+                pass
+            else:
+                self.view = memoryview(m)
 
     def __getitem__(self, i):
+        if self.view is not None:
+            sta = i.start or self.f.tell()
+            return bytes(self.view[sta : i.stop])
         stay = self.f.tell()
         sta = i.start or stay
         self.f.seek(sta, 0)
@@ -357,9 +596,25 @@ class DataIO(BinFormat):
 
 
 # ------------------------------------------------------------------------------
+# registry of supported program formats, as a list of
+# (magic bytes, amoco.system module, format class, format error, format name):
+
+FORMATS = [
+    (b"\x7fELF", "elf", "Elf", "ElfError", "ELF"),
+    (b"MZ", "pe", "PE", "PEError", "PE"),
+    (b"\xce\xfa\xed\xfe", "macho", "MachO", "MachOError", "Mach-O"),
+    (b"\xcf\xfa\xed\xfe", "macho", "MachO", "MachOError", "Mach-O"),
+    (b"\xca\xfe\xba\xbe", "macho", "MachO", "MachOError", "Mach-O"),
+    (b":", "utils", "HEX", "FormatError", "HEX"),
+    (b"S", "utils", "SREC", "FormatError", "SREC"),
+]
+
+
 def read_program(filename):
     """
     Identifies the program header and returns an ELF, PE, Mach-O or DataIO.
+    The format is selected from the first bytes of the program (see FORMATS)
+    so that only the matching format module is imported and parsed.
 
     Args:
         filename (str): the program to read.
@@ -371,73 +626,23 @@ def read_program(filename):
 
     try:
         data = open(filename, "rb")
-    except (TypeError, IOError):
+    except (TypeError, ValueError, IOError):
         data = bytes(filename)
 
     f = DataIO(data)
+    magic = f[0:4]
 
-    try:
-        from amoco.system import elf
-
-        # open file as a ELF object:
-        p = elf.Elf(f)
-        logger.info("ELF format detected")
-        return p
-    except elf.ElfError:
-        f.seek(0)
-        logger.debug("ElfError raised for %s" % f.name)
-
-    try:
-        from amoco.system import pe
-
-        # open file as a PE object:
-        p = pe.PE(f)
-        logger.info("PE format detected")
-        return p
-    except pe.PEError:
-        f.seek(0)
-        logger.debug("PEError raised for %s" % f.name)
-
-    try:
-        from amoco.system import macho
-
-        # open file as a Mach-O object:
-        p = macho.MachO(f)
-        logger.info("Mach-O format detected")
-        return p
-    except macho.MachOError:
-        f.seek(0)
-        logger.debug("MachOError raised for %s" % f.name)
-
-    try:
-        from amoco.system import macho
-        # open file as a Mach-O object:
-        p = macho.MachO(f)
-        logger.info("Mach-O format detected")
-        return p
-    except macho.MachOError:
-        f.seek(0)
-        logger.debug('MachOError raised for %s'%f.name)
-
-    try:
-        from amoco.system import utils
-
-        # open file as a HEX object:
-        p = utils.HEX(f)
-        logger.info("HEX format detected")
-        return p
-    except utils.FormatError:
-        f.seek(0)
-        logger.debug(" HEX FormatError raised for %s" % f.name)
-
-    try:
-        # open file as a SREC object:
-        p = utils.SREC(f)
-        logger.info("SREC format detected")
-        return p
-    except utils.FormatError:
-        f.seek(0)
-        logger.debug(" SREC FormatError raised for %s" % f.name)
+    for m, mod, cls, err, name in FORMATS:
+        if not magic.startswith(m):
+            continue
+        mod = importlib.import_module("amoco.system.%s" % mod)
+        try:
+            p = getattr(mod, cls)(f)
+            logger.info("%s format detected" % name)
+            return p
+        except getattr(mod, err):
+            f.seek(0)
+            logger.debug("%s raised for %s" % (err, f.name))
 
     logger.warning("unknown format")
     return f
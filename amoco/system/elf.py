@@ -45,9 +45,11 @@ class Elf(BinFormat):
         Shdr (list of Shdr): the list of ELF Section header structures.
         dynamic (Bool): True if the binary wants to load dynamic libs.
         basemap (int): base address for this ELF image.
-        functions (list): a list of function names gathered from internal
-                          definitions (if not stripped) and import names.
-        variables (list): a list of global variables' names (if found.)
+        functions (dict): function names gathered from internal
+                          definitions (if not stripped) and import names,
+                          decoded on first access.
+        variables (dict): global variables' names (if found,) decoded
+                          on first access.
     """
     is_ELF = True
 
@@ -119,8 +121,31 @@ class Elf(BinFormat):
                     s.name = decode(name)
 
         self.__sections = {}
-        self.functions = self.__functions()
-        self.variables = self.__variables()
+        # symbols and relocations are decoded on first access:
+        self._functions = None
+        self._variables = None
+
+    @property
+    def functions(self):
+        if self._functions is None:
+            self._functions = self.__functions()
+        return self._functions
+
+    @functions.setter
+    def functions(self, D):
+        self._functions = D
+        self._symbols_index = None
+
+    @property
+    def variables(self):
+        if self._variables is None:
+            self._variables = self.__variables()
+        return self._variables
+
+    @variables.setter
+    def variables(self, D):
+        self._variables = D
+        self._symbols_index = None
 
     def getsize(self):
         "total file size of all the Program headers"
@@ -142,33 +167,34 @@ class Elf(BinFormat):
             try:
                 addr = int(target, 16)
             except ValueError:
-                for a, f in iter(self.functions.items()):
-                    if f[0] == target:
-                        addr = int(a, 16)
-                        break
+                addr = self.getaddress(target)
         elif isinstance(target, int):
             addr = target
         if addr is None:
             # target is propably a symbol not found in functions
             return None, 0, 0
         # now we have addr so we can see in which section/segment it is...
+        s = self.getsection(addr)
+        if s is None:
+            return None, 0, 0
+        base = s.p_vaddr if isinstance(s, Phdr) else s.sh_addr
+        return s, addr - base, base
+
+    def _sections(self):
         # sections are smaller than segments so we try first with Shdr
         # but this may lead to errors because what really matters are segments
         # loaded by the kernel binfmt_elf.c loader.
         if self.Shdr:
-            for s in self.Shdr[::-1]:
-                if s.sh_type == SHT_NULL:
-                    continue
-                if s.sh_addr <= addr < s.sh_addr + s.sh_size:
-                    return s, addr - s.sh_addr, s.sh_addr
-            ##
-        elif self.Phdr:
-            for s in self.Phdr[::-1]:
-                if s.p_type != PT_LOAD:
-                    continue
-                if s.p_vaddr <= addr < s.p_vaddr + s.p_filesz:
-                    return s, addr - s.p_vaddr, s.p_vaddr
-        return None, 0, 0
+            return [
+                (s.sh_addr, s.sh_addr + s.sh_size, s)
+                for s in self.Shdr
+                if s.sh_type != SHT_NULL
+            ]
+        return [
+            (s.p_vaddr, s.p_vaddr + s.p_filesz, s)
+            for s in self.Phdr
+            if s.p_type == PT_LOAD
+        ]
 
     def data(self, target, size):
         "returns 'size' bytes located at target virtual address"
@@ -219,6 +245,11 @@ class Elf(BinFormat):
                     "wrong p_vaddr/p_align [%08x/%0d]" % (S.p_vaddr, S.p_align)
                 )
             base = S.p_vaddr
+            view = getattr(self.__file, "view", None)
+            if view is not None and S.p_memsz <= S.p_filesz >= (pagesize or 0):
+                # no padding needed: map the file data without copy.
+                sta = S.p_offset
+                return {base: view[sta : sta + S.p_filesz]}
             bytes_ = self.__file.read(S.p_filesz).ljust(S.p_memsz, b"\x00")
             if pagesize:
                 # note: bytes are not truncated, only extended if needed...
@@ -272,12 +303,7 @@ class Elf(BinFormat):
             raise ElfError("symbol table size mismatch")
         else:
             n = section.sh_size // l
-        symtab = []
-        offset = 0
-        for i in range(n):
-            symtab.append(Sym(data, offset, lbe, x64))
-            offset += l
-        return symtab
+        return list(Sym(order=lbe, x64=x64).iter_unpack(data, 0, n, l))
 
     def __read_strtab(self, section):
         if section.sh_type != SHT_STRTAB:
@@ -299,18 +325,13 @@ class Elf(BinFormat):
             raise ElfError("relocation table size mismatch")
         else:
             n = section.sh_size // l
-        reltab = []
         x64 = self.Ehdr.e_ident.EI_CLASS == ELFCLASS64
         lbe = ">" if (self.Ehdr.e_ident.EI_DATA == ELFDATA2MSB) else None
-        offset = 0
         if section.sh_type == SHT_REL:
             rcls = Rel
         elif section.sh_type == SHT_RELA:
             rcls = Rela
-        for i in range(n):
-            reltab.append(rcls(data, offset, lbe, x64))
-            offset += l
-        return reltab
+        return list(rcls(order=lbe, x64=x64).iter_unpack(data, 0, n, l))
 
     def __read_dynamic(self, section):
         if section.sh_type != SHT_DYNAMIC:
@@ -325,14 +346,9 @@ class Elf(BinFormat):
             raise ElfError("dynamic linking size mismatch")
         else:
             n = section.sh_size // l
-        dyntab = []
         x64 = self.Ehdr.e_ident.EI_CLASS == ELFCLASS64
         lbe = ">" if (self.Ehdr.e_ident.EI_DATA == ELFDATA2MSB) else None
-        offset = 0
-        for i in range(n):
-            dyntab.append(Dyn(data, offset, lbe, x64))
-            offset += l
-        return dyntab
+        return list(Dyn(order=lbe, x64=x64).iter_unpack(data, 0, n, l))
 
     def __read_note(self, section):
         if section.sh_type != SHT_NOTE:
@@ -1,4 +1,12 @@
 from amoco.system.structs import *
+from amoco.config import conf
+from amoco.logger import Log
+
+from collections import OrderedDict
+import struct
+
+logger = Log(__name__)
+logger.debug("loading module")
 
 SUPERBLOCK_SIZE = 2048
 BBLOCK = 0
@@ -347,11 +355,11 @@ class fsd(StructFormatter):
     def unpack(self, data, offset=0):
         sz = 0
         for f in self.fields[:2]:
-            setattr(self, f.name, f.unpack(data, offset + sz, self.order))
-            sz += f.size
+            setattr(self, f.name, f.unpack(data, offset + sz))
+            sz += f.size()
         f = self.fields[-1]
         f.count = self.fsd_size - sz
-        setattr(self, f.name, f.unpack(data, offset + sz, self.order))
+        setattr(self, f.name, f.unpack(data, offset + sz))
         return self
 
 
@@ -388,12 +396,12 @@ class direct(StructFormatter):
     def unpack(self, data, offset=0):
         sz = 0
         for f in self.fields[:3]:
-            setattr(self, f.name, f.unpack(data, offset + sz, self.order))
-            sz += f.size
+            setattr(self, f.name, f.unpack(data, offset + sz))
+            sz += f.size()
         f = self.fields[-1]
         assert self.d_namlen < (MAXNAMLEN + 1)
         f.count = self.d_namlen
-        setattr(self, f.name, f.unpack(data, offset + sz, self.order))
+        setattr(self, f.name, f.unpack(data, offset + sz))
         return self
 
 
@@ -432,11 +440,11 @@ class extent_block(StructFormatter):
     def unpack(self, data, offset=0):
         sz = 0
         for f in self.fields[:-1]:
-            setattr(self, f.name, f.unpack(data, offset + sz, self.order))
-            sz += f.size
+            setattr(self, f.name, f.unpack(data, offset + sz))
+            sz += f.size()
         f = self.fields[-1]
         f.count = self.nextents
-        setattr(self, f.name, f.unpack(data, offset + sz, self.order))
+        setattr(self, f.name, f.unpack(data, offset + sz))
         return self
 
 
@@ -565,54 +573,149 @@ class sect_trailer(StructFormatter):
 # ------------------------------------------------------------------------------
 
 
+class _Table(object):
+    """
+    Read-only sequence of count elements, each one provided by get(index).
+    """
+
+    __slots__ = ["get", "count"]
+
+    def __init__(self, get, count):
+        self.get = get
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.get(i)
+
+
 class UFS(object):
+    """
+    UFS filesystem reader. Only the superblock is decoded when the image is
+    opened: cylinder groups and inodes are decoded on demand and kept in
+    bounded LRU caches (of conf.System.fscache elements), directories are
+    walked lazily and file blocks are read through memoryview slices of the
+    image whenever possible.
+    """
+
     def __init__(self, dataIO, offset=0):
         self.data = dataIO
+        self.offset = offset
+        self.view = getattr(dataIO, "view", None)
+        if self.view is None and isinstance(dataIO, (bytes, bytearray)):
+            self.view = memoryview(dataIO)
         # bootblk = dataIO[BBOFF:BBSIZE]
-        S = superblock(dataIO, offset=SBOFF)
-        cylinders = []
-        for c in range(S.fs_ncg):
-            cg = cylinder(dataIO, offset=(S.cgtod(c) * S.fs_fsize))
-            cylinders.append(cg)
-        inodes = []
-        for c in cylinders:
-            offset = S.fs_fsize * S.cgimin(c.cg_cgx)
-            I = []
-            for x in range(c.cg_niblk):
-                I.append(inode(dataIO, offset))
-                offset += inode.size()
-            inodes.extend(I)
-        self.superblock = S
-        self.cylinders = cylinders
-        self.inodes = inodes
+        self.superblock = superblock(dataIO, offset=offset + SBOFF)
+        self._cgs = OrderedDict()
+        self._inodes = OrderedDict()
+
+    @staticmethod
+    def _cached(cache, key, load):
+        try:
+            obj = cache.pop(key)
+        except KeyError:
+            obj = load(key)
+        cache[key] = obj
+        if len(cache) > conf.System.fscache:
+            cache.popitem(last=False)
+        return obj
+
+    def _read(self, off, size):
+        if self.view is not None:
+            return self.view[off : off + size]
+        self.data.seek(off)
+        return self.data.read(size)
+
+    def __cg(self, c):
+        S = self.superblock
+        return cylinder(self.data, offset=self.offset + S.cgtod(c) * S.fs_fsize)
+
+    def __inode(self, n):
+        S = self.superblock
+        off = S.cgimin(S.itog(n)) * S.fs_fsize + (n % S.fs_ipg) * inode.size()
+        return inode(self.data, self.offset + off)
+
+    def getcg(self, c):
+        "returns the cylinder group c"
+        return self._cached(self._cgs, c, self.__cg)
+
+    def getinode(self, n):
+        "returns the inode number n"
+        return self._cached(self._inodes, n, self.__inode)
+
+    @property
+    def cylinders(self):
+        return _Table(self.getcg, self.superblock.fs_ncg)
+
+    @property
+    def inodes(self):
+        S = self.superblock
+        return _Table(self.getinode, S.fs_ncg * S.fs_ipg)
 
     def lookup(self, name, cwd=None):
-        i = cwd or self.inodes[UFSROOTINO]
+        i = cwd or self.getinode(UFSROOTINO)
         path = name.strip("/")
         for d in path.split("/"):
             if d == "":
                 continue
-            E = self.readdir(i)
+            if isinstance(d, str):
+                d = d.encode()
+            E = self.iterdir(i)
             i = None
             for e in E:
                 if e.d_name == d:
-                    i = self.inodes[e.d_ino]
+                    i = self.getinode(e.d_ino)
                     break
             if i is None:
                 logger.info("file not found: %s" % d)
                 break
         return i
 
-    def readdir(self, i):
+    def iterdir(self, i):
+        "yields the direct entries of directory inode i"
         assert i.is_dir()
         f = self.geti(i)
         off = 0
-        E = []
         while off < len(f):
             d = direct(f, offset=off)
-            E.append(d)
+            if d.d_reclen <= 0:
+                break
+            yield d
             off += d.d_reclen
-        return E
+
+    def readdir(self, i):
+        return list(self.iterdir(i))
+
+    def walk(self, top="/"):
+        """
+        yields (dirpath, dirnames, filenames) tuples for every directory
+        reachable from top, in the manner of os.walk. Only the inodes of
+        walked directories and of their entries are decoded.
+        """
+        i = self.lookup(top)
+        if i is None:
+            return
+        S = [(top.rstrip("/") or "/", i)]
+        while S:
+            path, i = S.pop()
+            dirs, files = [], []
+            for e in self.iterdir(i):
+                if e.d_ino == 0 or e.d_name in (b".", b".."):
+                    continue
+                name = e.d_name.decode(errors="replace")
+                x = self.getinode(e.d_ino)
+                if x.ic_smode & IFMT == IFDIR:
+                    dirs.append(name)
+                    S.append(("%s/%s" % (path.rstrip("/"), name), x))
+                else:
+                    files.append(name)
+            yield (path, dirs, files)
 
     def readfsd(self, i):
         assert i.is_shadow()
@@ -629,67 +732,62 @@ class UFS(object):
         S = self.superblock
         off = S.fs_logbno * S.fs_fsize
         if off != 0:
-            return extent_block(self.data, offset=off)
+            return extent_block(self.data, offset=self.offset + off)
         else:
             return None
 
-    def geti(self, i):
+    def __indirect(self, b, level):
         S = self.superblock
-
-        def getblks(blist, data, fsz, lsz):
-            blks = []
-            sz = 0
-            for b in blist:
-                if b == 0:
-                    continue
-                off = b * fsz
-                blks.append(data[off : off + fsz])
-                sz += fsz
-                if sz >= lsz:
-                    cut = fsz - (sz - lsz)
-                    blks[-1] = blks[-1][0:cut]
-                    sz = lsz
-                    break
-            return (blks, sz)
-
-        def getindir(pos, data, bsz, order):
-            data.seek(pos)
-            return struct.unpack(order + "%di" % (bsz // 4), data.read(bsz))
-
-        f, sz = getblks(i.ic_db, self.data, S.fs_fsize, i.ic_lsize)
-        # first-indirect blocks:
-        if sz < i.ic_lsize:
-            indir0 = getindir(i.ic_ib[0] * S.fs_fsize, self.data, S.fs_bsize, S.order)
-            l, isz = getblks(indir0, self.data, S.fs_fsize, i.ic_lsize - sz)
-            f.extend(l)
-            sz += isz
-        # second-indirect blocks:
-        if sz < i.ic_lsize:
-            indir1 = getindir(i.ic_ib[1] * S.fs_fsize, self.data, S.fs_bsize, S.order)
-            for ind0 in [
-                getindir(pos, self.data, S.fs_bsize, S.order) for pos in indir1
-            ]:
-                l, isz = getblks(ind0, self.data, S.fs_fsize, i.ic_lsize - sz)
-                f.extend(l)
-                sz += isz
-                if sz == i.ic_lsize:
-                    break
-        # third-indirect blocks:
-        if sz < i.ic_lsize:
-            indir2 = getindir(i.ic_ib[2] * S.fs_fsize, self.data, S.fs_bsize, S.order)
-            for indir1 in [
-                getindir(pos1, self.data, S.fs_bsize, S.order) for pos1 in indir2
-            ]:
-                for ind0 in [
-                    getindir(pos0, self.data, S.fs_bsize, S.order) for pos0 in indir1
-                ]:
-                    l, isz = getblks(ind0, self.data, S.fs_fsize, i.ic_lsize - sz)
-                    f.extend(l)
-                    sz += isz
-                    if sz == i.ic_lsize:
-                        break
-                if sz == i.ic_lsize:
-                    break
-        if sz != i.ic_lsize:
+        if b == 0:
+            return
+        data = self._read(self.offset + b * S.fs_fsize, S.fs_bsize)
+        P = struct.unpack(S.fields[0].order + "%di" % (len(data) // 4), data)
+        if level == 0:
+            yield from P
+        else:
+            for p in P:
+                yield from self.__indirect(p, level - 1)
+
+    def blocks(self, i):
+        "yields the fragment addresses of the data blocks of inode i"
+        yield from i.ic_db
+        for level, b in enumerate(i.ic_ib):
+            yield from self.__indirect(b, level)
+
+    def extents(self, i):
+        """
+        yields the (offset, size) byte ranges of the image that hold the
+        content of inode i, where contiguous blocks are merged together.
+        Indirect blocks are only read as long as the file is not complete.
+        """
+        S = self.superblock
+        rem = i.ic_lsize
+        start = end = None
+        for b in self.blocks(i):
+            if rem <= 0:
+                break
+            if b == 0:
+                continue
+            off = self.offset + b * S.fs_fsize
+            n = min(S.fs_bsize, rem)
+            rem -= n
+            if off == end:
+                end += n
+            else:
+                if start is not None:
+                    yield (start, end - start)
+                start, end = off, off + n
+        if start is not None:
+            yield (start, end - start)
+        if rem > 0:
             logger.warning("incomplete inode %s" % repr(i))
-        return "".join(f)
+
+    def geti(self, i):
+        "returns the content of inode i"
+        return b"".join([self._read(o, n) for (o, n) in self.extents(i)])
+
+    def read(self, name, cwd=None):
+        "returns the content of the file at given path (or None)"
+        i = self.lookup(name, cwd)
+        if i is not None:
+            return self.geti(i)
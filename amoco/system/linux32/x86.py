@@ -202,6 +202,10 @@ class Task(CoreExec):
             f.name = "_start"
         # get section symbol if any:
         f.misc["section"] = section = self.bin.getinfo(f.address.value)[0]
+        # get function symbol if any:
+        sym = self.bin.getsymbol(f.address.value)
+        if sym is not None and sym[1] == 0:
+            f.name = sym[0]
         # check leaves:
         rets = f.cfg.leaves()
         if len(rets) == 0:
@@ -11,9 +11,10 @@ system/macho.py
 The system macho module implements the Mach-O executable format parser.
 """
 
+from array import array
 from collections import defaultdict
 from amoco.system.core import BinFormat, DataIO
-from amoco.system.utils import read_uleb128
+from amoco.system.utils import read_uleb128, read_sleb128
 from amoco.system.structs import Consts, StructFormatter, default_formatter
 from amoco.system.structs import StructDefine, UnionDefine
 
@@ -47,8 +48,10 @@ class MachO(BinFormat):
         entrypoints (list of int): list of entrypoint addresses.
         filename (str): binary file name.
         header (struct_mach_header): the Mach header structure.
-        archs (list of MachO): the list of MachO instances in case the
-                               provided binary file is a "fat" format.
+        archs (list of struct_fat_arch): the list of architectures in case
+                               the provided binary file is a "fat" format.
+                               The MachO instance of each slice is in its
+                               'bin' attribute (None if not selected.)
         cmds (list): the list of all "command" structures.
         dynamic (Bool): True if the binary wants to load dynamic libs.
         basemap (int): Base address of the binary (or None.)
@@ -56,10 +59,15 @@ class MachO(BinFormat):
         dysymtab (list): the dynamic symbol table.
         dyld_info (container): a container with dyld_info attributes
                                rebase, bind, weak_bind, lazy_bind
-                               and export.
-        function_starts (list,optional): list of function start addresses.
+                               and export. The rebase and bind opcodes
+                               are decoded as RebaseTable/BindTable.
+        function_starts (array,optional): function start addresses.
         la_symbol_ptr (dict): address to lazy symbol bindings
         nl_symbol_ptr (dict): address to non-lazy symbol bindings
+
+    Note:
+        If cputype is provided for a "fat" binary, only the slice of this
+        cputype is parsed.
     """
     is_MachO = True
 
@@ -84,10 +92,12 @@ class MachO(BinFormat):
     def filename(self):
         return self.__file.name
 
-    def __init__(self, f):
+    def __init__(self, f, cputype=None):
         self.__file = f
         self.__entry = None
         self._is_fat = False
+        self._la_symbol_ptr = None
+        self._nl_symbol_ptr = None
         try:
             self.header = struct_mach_header(f)
         except:
@@ -107,7 +117,9 @@ class MachO(BinFormat):
                 a = struct_fat_arch(f, offset)
                 offset += len(a)
                 self.archs.append(a)
-                self.read_fat_arch(a)
+                a.bin = None
+                if cputype is None or a.cputype == cputype:
+                    self.read_fat_arch(a)
         else:
             self.cmds = self.read_commands(offset)
             for c in self.cmds:
@@ -121,17 +133,36 @@ class MachO(BinFormat):
                     self.dyld_info = self.__read_dyld_info(c)
                 elif c.cmd == LC_FUNCTION_STARTS:
                     self.function_starts = self.__read_funcstarts(c)
-            self.la_symbol_ptr = self.__la_bindings()
-            self.nl_symbol_ptr = self.__nl_bindings()
+
+    @property
+    def la_symbol_ptr(self):
+        if self._la_symbol_ptr is None:
+            self._la_symbol_ptr = self.__la_bindings()
+        return self._la_symbol_ptr
+
+    @property
+    def nl_symbol_ptr(self):
+        if self._nl_symbol_ptr is None:
+            self._nl_symbol_ptr = self.__nl_bindings()
+        return self._nl_symbol_ptr
 
     def read_fat_arch(self, a):
         """
         takes a struct_fat_arch instance and sets its 'bin' attribute
         to the corresponding MachO instance.
         """
-        self.__f.seek(a.offset)
-        data = self.__f.read(a.size)
+        self.__file.seek(a.offset)
+        # note: a.size is the StructCore.size method...
+        data = self.__file.read(a["size"])
         a.bin = MachO(DataIO(data))
+        return a.bin
+
+    def slice(self, cputype):
+        "returns the MachO instance of the fat binary slice for cputype"
+        for a in self.archs:
+            if a.cputype == cputype:
+                return a.bin or self.read_fat_arch(a)
+        return None
 
     def read_commands(self, offset):
         "returns the list of struct_load_command starting from given offset"
@@ -165,13 +196,18 @@ class MachO(BinFormat):
         into segment, and segment virtual base address that contains the
         target argument.
         """
-        res = (None, 0, 0)
-        for c in self.cmds:
-            if c.cmd in (LC_SEGMENT, LC_SEGMENT_64,):
-                if c.vmaddr <= target <= (c.vmaddr + c.vmsize):
-                    res = (c, (target - c.vmaddr), c.vmaddr)
-                    break
-        return res
+        c = self.getsection(target)
+        if c is None:
+            return (None, 0, 0)
+        return (c, (target - c.vmaddr), c.vmaddr)
+
+    def _sections(self):
+        # segments bounds are inclusive, first segments take precedence:
+        return [
+            (c.vmaddr, c.vmaddr + c.vmsize + 1, c)
+            for c in reversed(self.cmds)
+            if c.cmd in (LC_SEGMENT, LC_SEGMENT_64,)
+        ]
 
     def data(self, target, size):
         "returns 'size' bytes located at target virtual address"
@@ -211,9 +247,8 @@ class MachO(BinFormat):
             self.__file.seek(off)
             if sz == 0:
                 sz = elt.size()
-            for n in range(count):
-                data = self.__file.read(sz)
-                tab.append(elt(data))
+            data = self.__file.read(sz * count)
+            tab.extend(elt().iter_unpack(data, 0, count, sz))
         return tab
 
     def __read_symtab(self, s):
@@ -247,91 +282,26 @@ class MachO(BinFormat):
 
     def __read_dyld_info(self, cmd):
         t = type("container", (object,), {})
-        # rebase opcodes (raw):
+        l = 8 if self.header.magic == MH_MAGIC_64 else 4
+        # rebase opcodes (as a table of rebase records):
         self.__file.seek(cmd.rebase_off)
-        t.rebase = self.__file.read(cmd.rebase_size)
-        # bind opcodes (as a list of binding records):
+        t.rebase = RebaseTable(self.__file.read(cmd.rebase_size), l)
+        # bind opcodes (as a table of binding records):
         self.__file.seek(cmd.bind_off)
-        rawbind = self.__file.read(cmd.bind_size)
-        t.bind = self.__read_bind_opcodes(rawbind)
-        # weak_bind opcodes (as a list of binding records):
+        t.bind = BindTable(self.__file.read(cmd.bind_size), l)
+        # weak_bind opcodes (as a table of binding records):
         self.__file.seek(cmd.weak_bind_off)
-        weak_bind = self.__file.read(cmd.weak_bind_size)
-        t.weak_bind = self.__read_bind_opcodes(weak_bind)
-        # lazy_bind opcodes (as a list of binding records):
+        t.weak_bind = BindTable(self.__file.read(cmd.weak_bind_size), l)
+        # lazy_bind opcodes (as a table of binding records):
         # see source code: the record type is POINTER by default...
         self.__file.seek(cmd.lazy_bind_off)
         lazy_bind = self.__file.read(cmd.lazy_bind_size)
-        t.lazy_bind = self.__read_bind_opcodes(lazy_bind, BIND_TYPE_POINTER)
+        t.lazy_bind = BindTable(lazy_bind, l, BIND_TYPE_POINTER)
         # exports (raw):
         self.__file.seek(cmd.export_off)
         t.export = self.__file.read(cmd.export_size)
         return t
 
-    # see dyld source: ImageLoaderMachOCompressed.cpp.
-    def __read_bind_opcodes(self, raw, default_type=0):
-        r = record(0, 0, 0, default_type, 0, 0)
-        L = []
-        cur = 0
-        l = 8 if self.header.magic == MH_MAGIC_64 else 4
-        while cur < len(raw):
-            op = raw[cur] & BIND_OPCODE_MASK
-            im = raw[cur] & BIND_IMMEDIATE_MASK
-            cur += 1
-            if op == BIND_OPCODE_DONE:
-                r = record(0, 0, 0, 0, 0, 0)
-            elif op == BIND_OPCODE_SET_DYLIB_ORDINAL_IMM:
-                r.lib_ordinal = im
-            elif op == BIND_OPCODE_SET_DYLIB_ORDINAL_ULEB:
-                val, cnt = read_uleb128(raw[cur:])
-                r.lib_ordinal = val
-                cur += cnt
-            elif op == BIND_OPCODE_SET_ADDEND_SLEB:
-                val, cnt = read_sleb128(raw[cur:])
-                r.addend = val
-                cur += cnt
-            elif op == BIND_OPCODE_SET_DYLIB_SPECIAL_IMM:
-                r.lib_ordinal = (0, -1, -2)[im]
-            elif op == BIND_OPCODE_SET_SYMBOL_TRAILING_FLAGS_IMM:
-                r.flags = im
-                nulchar = raw.find(b"\0", cur)
-                if nulchar > cur:
-                    r.symbol = raw[cur:nulchar]
-                cur = nulchar + 1
-            elif op == BIND_OPCODE_SET_TYPE_IMM:
-                r.type = im
-            elif op == BIND_OPCODE_SET_SEGMENT_AND_OFFSET_ULEB:
-                r.seg_index = im
-                val, cnt = read_uleb128(raw[cur:])
-                r.seg_offset = val
-                cur += cnt
-            elif op == BIND_OPCODE_DO_BIND:
-                L.append(r.as_list())
-                r.seg_offset += l
-            elif op == BIND_OPCODE_ADD_ADDR_ULEB:
-                val, cnt = read_uleb128(raw[cur:])
-                r.seg_offset += val
-                cur += cnt
-            elif op == BIND_OPCODE_DO_BIND_ADD_ADDR_ULEB:
-                L.append(r.as_list())
-                val, cnt = read_uleb128(raw[cur:])
-                r.seg_offset += l + val
-                cur += cnt
-            elif op == BIND_OPCODE_DO_BIND_ADD_ADDR_IMM_SCALED:
-                L.append(r.as_list())
-                r.seg_offset += im * l + l
-                cur += cnt
-            elif op == BIND_OPCODE_DO_BIND_ULEB_TIMES_SKIPPING_ULEB:
-                count, cnt = read_uleb128(raw[cur:])
-                skip, cnt2 = read_uleb128(raw[cur + cnt :])
-                for i in range(count):
-                    L.append(r.as_list())
-                    r.seg_offset += skip + l
-                cur += cnt + cnt2
-            else:
-                raise NotImplementedError
-        return L
-
     def __read_dysymtab(self, cmd):
         t = type("container", (object,), {})
         # read table of contents:
@@ -389,25 +359,20 @@ class MachO(BinFormat):
 
     # source: https://opensource.apple.com/source/ld64/ld64-127.2/src/other/dyldinfo.cpp
     def __read_funcstarts(self, fs):
-        fbaseaddr = self.basemap
-        addr = fbaseaddr
-        F = []
+        addr = self.basemap
+        F = array("Q")
         if fs is not None:
             self.__file.seek(fs.dataoff)
             data = self.__file.read(fs.datasize)
             p = 0
             while p < len(data):
-                delta, shift = 0, 0
-                more = True
-                while more:
-                    b = data[p]
-                    p += 1
-                    delta |= (b & 0x7F) << shift
-                    shift += 7
-                    if b < 0x80:
-                        addr += delta
-                        F.append(addr)
-                        more = False
+                delta, cnt = read_uleb128(data, p)
+                p += cnt
+                # a null delta terminates the (padded) stream:
+                if delta == 0:
+                    break
+                addr += delta
+                F.append(addr)
         return F
 
     def __str__(self):
@@ -1823,6 +1788,190 @@ class struct_dyld_info_command(MachoFormatter):
             self.unpack(data, offset)
 
 
+def iter_bind_opcodes(raw, ptrsize, default_type=0):
+    """
+    Decodes the dyld bind opcodes stream raw incrementally and yields
+    binding records as tuples (see record.as_list).
+    See dyld source: ImageLoaderMachOCompressed.cpp.
+    """
+    r = record(0, 0, 0, default_type, 0, 0)
+    cur = 0
+    l = ptrsize
+    while cur < len(raw):
+        op = raw[cur] & BIND_OPCODE_MASK
+        im = raw[cur] & BIND_IMMEDIATE_MASK
+        cur += 1
+        if op == BIND_OPCODE_DONE:
+            r = record(0, 0, 0, 0, 0, 0)
+        elif op == BIND_OPCODE_SET_DYLIB_ORDINAL_IMM:
+            r.lib_ordinal = im
+        elif op == BIND_OPCODE_SET_DYLIB_ORDINAL_ULEB:
+            val, cnt = read_uleb128(raw, cur)
+            r.lib_ordinal = val
+            cur += cnt
+        elif op == BIND_OPCODE_SET_ADDEND_SLEB:
+            val, cnt = read_sleb128(raw, cur)
+            r.addend = val
+            cur += cnt
+        elif op == BIND_OPCODE_SET_DYLIB_SPECIAL_IMM:
+            r.lib_ordinal = (0, -1, -2)[im]
+        elif op == BIND_OPCODE_SET_SYMBOL_TRAILING_FLAGS_IMM:
+            r.flags = im
+            nulchar = raw.find(b"\0", cur)
+            if nulchar > cur:
+                r.symbol = raw[cur:nulchar]
+            cur = nulchar + 1
+        elif op == BIND_OPCODE_SET_TYPE_IMM:
+            r.type = im
+        elif op == BIND_OPCODE_SET_SEGMENT_AND_OFFSET_ULEB:
+            r.seg_index = im
+            val, cnt = read_uleb128(raw, cur)
+            r.seg_offset = val
+            cur += cnt
+        elif op == BIND_OPCODE_DO_BIND:
+            yield r.as_list()
+            r.seg_offset += l
+        elif op == BIND_OPCODE_ADD_ADDR_ULEB:
+            val, cnt = read_uleb128(raw, cur)
+            r.seg_offset += val
+            cur += cnt
+        elif op == BIND_OPCODE_DO_BIND_ADD_ADDR_ULEB:
+            yield r.as_list()
+            val, cnt = read_uleb128(raw, cur)
+            r.seg_offset += l + val
+            cur += cnt
+        elif op == BIND_OPCODE_DO_BIND_ADD_ADDR_IMM_SCALED:
+            yield r.as_list()
+            r.seg_offset += im * l + l
+        elif op == BIND_OPCODE_DO_BIND_ULEB_TIMES_SKIPPING_ULEB:
+            count, cnt = read_uleb128(raw, cur)
+            skip, cnt2 = read_uleb128(raw, cur + cnt)
+            for i in range(count):
+                yield r.as_list()
+                r.seg_offset += skip + l
+            cur += cnt + cnt2
+        else:
+            raise NotImplementedError
+
+
+def iter_rebase_opcodes(raw, ptrsize):
+    """
+    Decodes the dyld rebase opcodes stream raw incrementally and yields
+    (seg_index, seg_offset, type) rebase records.
+    """
+    seg_index = seg_offset = typ = 0
+    cur = 0
+    l = ptrsize
+    while cur < len(raw):
+        op = raw[cur] & REBASE_OPCODE_MASK
+        im = raw[cur] & REBASE_IMMEDIATE_MASK
+        cur += 1
+        if op == REBASE_OPCODE_DONE:
+            break
+        elif op == REBASE_OPCODE_SET_TYPE_IMM:
+            typ = im
+        elif op == REBASE_OPCODE_SET_SEGMENT_AND_OFFSET_ULEB:
+            seg_index = im
+            seg_offset, cnt = read_uleb128(raw, cur)
+            cur += cnt
+        elif op == REBASE_OPCODE_ADD_ADDR_ULEB:
+            val, cnt = read_uleb128(raw, cur)
+            seg_offset += val
+            cur += cnt
+        elif op == REBASE_OPCODE_ADD_ADDR_IMM_SCALED:
+            seg_offset += im * l
+        elif op == REBASE_OPCODE_DO_REBASE_IMM_TIMES:
+            for i in range(im):
+                yield (seg_index, seg_offset, typ)
+                seg_offset += l
+        elif op == REBASE_OPCODE_DO_REBASE_ULEB_TIMES:
+            count, cnt = read_uleb128(raw, cur)
+            cur += cnt
+            for i in range(count):
+                yield (seg_index, seg_offset, typ)
+                seg_offset += l
+        elif op == REBASE_OPCODE_DO_REBASE_ADD_ADDR_ULEB:
+            yield (seg_index, seg_offset, typ)
+            val, cnt = read_uleb128(raw, cur)
+            seg_offset += val + l
+            cur += cnt
+        elif op == REBASE_OPCODE_DO_REBASE_ULEB_TIMES_SKIPPING_ULEB:
+            count, cnt = read_uleb128(raw, cur)
+            skip, cnt2 = read_uleb128(raw, cur + cnt)
+            for i in range(count):
+                yield (seg_index, seg_offset, typ)
+                seg_offset += skip + l
+            cur += cnt + cnt2
+        else:
+            raise NotImplementedError
+
+
+class BindTable(object):
+    """
+    Table of binding records decoded from a dyld bind opcodes stream.
+    Records are stored in compact arrays (with symbol names stored once)
+    and the table behaves as a sequence of record tuples.
+    """
+
+    __slots__ = ["raw", "cols", "symbols"]
+
+    def __init__(self, raw, ptrsize, default_type=0):
+        self.raw = raw
+        # seg_index, seg_offset, lib_ordinal, type, flags, addend, symbol:
+        self.cols = [array(c) for c in "BQiBBqI"]
+        self.symbols = []
+        index = {}
+        cols = self.cols
+        for r in iter_bind_opcodes(raw, ptrsize, default_type):
+            for c, v in zip(cols, r[:6]):
+                c.append(v)
+            s = r[6]
+            i = index.get(s)
+            if i is None:
+                i = index[s] = len(self.symbols)
+                self.symbols.append(s)
+            cols[6].append(i)
+
+    def __len__(self):
+        return len(self.cols[0])
+
+    def __getitem__(self, i):
+        r = [c[i] for c in self.cols]
+        r[6] = self.symbols[r[6]]
+        return tuple(r)
+
+    def __iter__(self):
+        S = self.symbols
+        for r in zip(*self.cols):
+            yield r[:6] + (S[r[6]],)
+
+
+class RebaseTable(object):
+    """
+    Table of rebase records decoded from a dyld rebase opcodes stream.
+    Records are stored in compact arrays and the table behaves as a
+    sequence of (seg_index, seg_offset, type) tuples.
+    """
+
+    __slots__ = ["raw", "cols"]
+
+    def __init__(self, raw, ptrsize):
+        self.raw = raw
+        self.cols = [array(c) for c in "BQB"]
+        for r in iter_rebase_opcodes(raw, ptrsize):
+            for c, v in zip(self.cols, r):
+                c.append(v)
+
+    def __len__(self):
+        return len(self.cols[0])
+
+    def __getitem__(self, i):
+        return tuple(c[i] for c in self.cols)
+
+    def __iter__(self):
+        return zip(*self.cols)
+
+
 class record(object):
     def __init__(self, indx, off, ordinal, typ, flags, addend, s=None):
         self.seg_index = indx
@@ -150,7 +150,7 @@ class MemoryMap(object):
         for r, z in other._zones.items():
             if r in self._zones:
                 for o in z._map:
-                    self._zones[r].addtomap(o)
+                    self._zones[r].addtomap(o.copy())
             else:
                 self._zones[r] = z
 
@@ -190,17 +190,21 @@ class MemoryZone(object):
 
         shift(offset): shift all mo objects by a given offset.
 
+        copy(): returns a copy of the zone that shares its mo objects with
+            the current zone until one of them needs to be modified.
+
         grep(pattern): find all occurences of the given regular expression in
             the raw bytes objects of the zone.
     """
 
-    __slots__ = ["rel", "_map", "__cache", "__hist"]
+    __slots__ = ["rel", "_map", "__cache", "__hist", "__shared"]
 
     def __init__(self, rel=None):
         self.rel = rel
         self._map = []
         self.__cache = []  # speedup locate method
         self.__hist = []
+        self.__shared = False  # mo objects are possibly shared with a copy
 
     def range(self):
         try:
@@ -218,16 +222,26 @@ class MemoryZone(object):
         self.__cache = [z.vaddr for z in self._map]
 
     def copy(self):
+        # copy-on-write: mo objects are shared by both zones until one of
+        # them needs to modify a mo object (see __own).
         z = MemoryZone(self.rel)
-        z._map = [o.copy() for o in self._map]
-        z.restruct()
+        z._map = self._map[:]
+        z.__cache = self.__cache[:]
+        z.__shared = self.__shared = True
         return z
 
+    def __own(self, i):
+        "get the i-th mo object, copied first if it is possibly shared"
+        o = self._map[i]
+        if self.__shared:
+            o = self._map[i] = o.copy()
+        return o
+
     def locate(self, vaddr):
         p = self.__cache
-        if vaddr in p:
-            return p.index(vaddr)
         i = bisect_left(p, vaddr)
+        if i < len(p) and p[i] == vaddr:
+            return i
         if i == 0:
             return None
         else:
@@ -284,23 +298,19 @@ class MemoryZone(object):
         self.addtomap(mo(vaddr, data, endian))
 
     def addtomap(self, z):
+        # _map and its vaddr cache are kept sorted and are updated in place
+        # so that locate/insert only cost a bisect and a slice assignment.
         i = self.locate(z.vaddr)
         j = self.locate(z.end)
-        # h = []
         if j is None:
             self._map.insert(0, z)
-            self.__update_cache()
+            self.__cache.insert(0, z.vaddr)
             return
         if j == i:
-            ii = self._map[i].copy()
-            ii.trim(z.vaddr)
-            # h.insert(0,ii)
-            Z = self._map[i].write(z.vaddr, z.data.val, z.data.endian)
+            Z = self.__own(i).write(z.vaddr, z.data.val, z.data.endian)
             i += 1
-            for newz in Z:
-                self._map.insert(i, newz)
-                i += 1
-            self.__update_cache()
+            self._map[i:i] = Z
+            self.__cache[i:i] = [o.vaddr for o in Z]
             return
         # i!=j cases:
         if i is not None:
@@ -308,40 +318,36 @@ class MemoryZone(object):
         # delete & update every overwritten zones
         # by adjusting [i,j]:
         if z.end in self._map[j]:
-            jj = self._map[j].copy()
-            jj.setlen(z.end - z.vaddr)
-            # h.insert(0,jj)
-            self._map[j].trim(z.end)
+            self.__own(j).trim(z.end)
+            self.__cache[j] = z.end
         else:
             j += 1
         Z = [z]
         if i is None:
             i = -1
         elif z.vaddr <= self._map[i].end:
-            ii = self._map[i].copy()
-            ii.trim(z.vaddr)
-            # h.insert(0,ii)
             # overright data:
-            Z = self._map[i].write(z.vaddr, z.data.val, z.data.endian)
+            Z = self.__own(i).write(z.vaddr, z.data.val, z.data.endian)
         i += 1
-        # h = self._map[i:j]+h
-        del self._map[i:j]
-        # insert new zones:
-        for newz in Z:
-            self._map.insert(i, newz)
-            i += 1
-        # if len(h)>0: self.__hist.insert(0,h)
-        self.__update_cache()
+        # replace overwritten zones with new zones:
+        self._map[i:j] = Z
+        self.__cache[i:j] = [o.vaddr for o in Z]
 
     def restruct(self):
         if len(self._map) == 0:
             return
-        m = [self._map.pop(0)]
-        for z in self._map:
+        m = [self._map[0]]
+        for z in self._map[1:]:
             rawtype = z.data._is_raw & m[-1].data._is_raw
+            if rawtype and isinstance(z.data.val, memoryview):
+                rawtype = False
+            if rawtype and isinstance(m[-1].data.val, memoryview):
+                rawtype = False
             if rawtype and (z.vaddr == m[-1].end):
                 try:
-                    m[-1].data.val += z.data.val
+                    # merged data goes into a new mo that is never shared:
+                    data = m[-1].data
+                    m[-1] = mo(m[-1].vaddr, data.val + z.data.val, data.endian)
                 except TypeError:
                     m.append(z)
             else:
@@ -350,6 +356,9 @@ class MemoryZone(object):
         self.__update_cache()
 
     def shift(self, offset):
+        if self.__shared:
+            self._map = [z.copy() for z in self._map]
+            self.__shared = False
         for z in self._map:
             z.vaddr += offset
         self.__update_cache()
@@ -361,11 +370,8 @@ class MemoryZone(object):
         res = []
         for z in self._map:
             if z.data._is_raw:
-                off = 0
-                for s in g.findall(z.data.val):
-                    off = z.data.val.index(s, off)
-                    res.append(z.vaddr + off)
-                    off += len(s)
+                for m in g.finditer(z.data.val):
+                    res.append(z.vaddr + m.start())
         return res
 
 
@@ -455,7 +461,9 @@ class datadiv(object):
     A datadiv represents any data within memory, including symbolic expressions.
 
     Args:
-        data   : either a string of bytes or an amoco expression.
+        data   : either a string of bytes, a memoryview of bytes (mapped
+                 without copy from a program file, see DataIO) or
+                 an amoco expression.
         endian : either [-1,1], used when data is any symbolic expression.
                  1 is for little-endian, -1 for big-endian.
 
@@ -486,6 +494,15 @@ class datadiv(object):
         self.val = data
         self.endian = endian
 
+    def __getstate__(self):
+        val = self.val
+        if isinstance(val, memoryview):
+            val = bytes(val)
+        return (val, self.endian)
+
+    def __setstate__(self, state):
+        self.val, self.endian = state
+
     @property
     def _is_raw(self):
         return not hasattr(self.val, "_is_def")
@@ -495,6 +512,8 @@ class datadiv(object):
 
     def __repr__(self):
         s = repr(self.val)
+        if isinstance(self.val, memoryview):
+            s = repr(bytes(self.val[:32]))
         if len(s) > 32:
             s = s[:32] + "..."
             if isinstance(self.val, bytes):
@@ -502,6 +521,8 @@ class datadiv(object):
         return "<datadiv:%s>" % s
 
     def __str__(self):
+        if isinstance(self.val, memoryview):
+            return repr(bytes(self.val))
         return repr(self.val) if self._is_raw else str(self.val)
 
     def cut(self, l):
@@ -526,6 +547,9 @@ class datadiv(object):
             logger.error("invalid fetch (o=%s,l=%s) in %s" % (o, l, repr(self)))
             raise ValueError
         lv = len(self)
+        if isinstance(self.val, memoryview):
+            res = bytes(self.val[o : o + l])
+            return (res, l - len(res))
         if o == 0 and l == lv:
             return (self.val, 0)
         if self._is_raw:
@@ -541,10 +565,17 @@ class datadiv(object):
         P = [datadiv(data, endian)]
         olv = o + len(data)
         endl = len(self) - olv
+        # note: memoryviews are sliced directly to avoid copies.
         if endl > 0:
-            P.append(datadiv(self.getpart(olv, endl)[0], self.endian))
+            if isinstance(self.val, memoryview):
+                P.append(datadiv(self.val[olv:], self.endian))
+            else:
+                P.append(datadiv(self.getpart(olv, endl)[0], self.endian))
         if o > 0:
-            P.insert(0, datadiv(self.getpart(0, o)[0], self.endian))
+            if isinstance(self.val, memoryview):
+                P.insert(0, datadiv(self.val[:o], self.endian))
+            else:
+                P.insert(0, datadiv(self.getpart(0, o)[0], self.endian))
         # now merge contiguous parts if they have same type:
         return mergeparts(P)
 
@@ -565,6 +596,10 @@ def mergeparts(P):
     while len(P) > 0:
         p = P.pop(0)
         if parts[-1]._is_raw and p._is_raw:
+            if isinstance(parts[-1].val, memoryview) or isinstance(p.val, memoryview):
+                # keep memoryviews (not materialized) as separate parts:
+                parts.append(p)
+                continue
             try:
                 parts[-1].val += p.val
             except TypeError:
@@ -176,6 +176,10 @@ class Task(CoreExec):
             f.name = "_start"
         # get section symbol if any:
         f.misc["section"] = section = self.bin.getinfo(f.address.value)[0]
+        # get function symbol if any:
+        sym = self.bin.getsymbol(f.address.value)
+        if sym is not None and sym[1] == 0:
+            f.name = sym[0]
         rets = f.cfg.leaves()
         if len(rets) == 0:
             logger.warning("no exit to function %s found" % f)
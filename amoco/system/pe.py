@@ -50,10 +50,15 @@ class PE(BinFormat):
         Opt (OptionalHdr): the Optional Header
         basemap (int): base address for this ELF image.
         sections (list of SectionHdr): list of PE sections.
-        functions (list): a list of function names gathered from internal
-                          definitions (if not stripped) and import names.
-        variables (list): a list of global variables' names (if found.)
+        functions (dict): import names by address of their IAT entry.
+        variables (dict): global variables' names (if found.)
+        exports (dict): exported names by address.
+        relocations (list): (rva, type) base relocations.
         tls (TlsTable): the Thead local Storage table (or None.)
+
+    Note:
+        Data directories (imports, exports, relocations and tls) are
+        parsed on first access of the associated attribute.
     """
     is_PE = True
 
@@ -83,15 +88,56 @@ class PE(BinFormat):
         if self.NT.SizeOfOptionalHeader != len(self.Opt):
             logger.warning("Optional header size mismatch")
         # read Sections:
-        self.sections = []
         offset = self.DOS.e_lfanew + len(self.NT) + self.NT.SizeOfOptionalHeader
-        for i in range(self.NT.NumberOfSections):
-            s = SectionHdr(data, offset)
-            self.sections.append(s)
-            offset += len(s)
-        self.functions = self.__functions()
-        self.variables = self.__variables()
-        self.tls = self.__tls()
+        self.sections = list(
+            SectionHdr().iter_unpack(data, offset, self.NT.NumberOfSections)
+        )
+        self.__sdata = {}
+        self._functions = None
+        self._variables = None
+        self._exports = None
+        self._relocations = None
+        self._tls = None
+
+    @property
+    def functions(self):
+        if self._functions is None:
+            self._functions = self.__functions()
+        return self._functions
+
+    @functions.setter
+    def functions(self, D):
+        self._functions = D
+        self._symbols_index = None
+
+    @property
+    def variables(self):
+        if self._variables is None:
+            self._variables = self.__variables()
+        return self._variables
+
+    @variables.setter
+    def variables(self, D):
+        self._variables = D
+        self._symbols_index = None
+
+    @property
+    def exports(self):
+        if self._exports is None:
+            self._exports = self.__exports()
+        return self._exports
+
+    @property
+    def relocations(self):
+        if self._relocations is None:
+            self._relocations = self.__relocations()
+        return self._relocations
+
+    @property
+    def tls(self):
+        if self._tls is None:
+            self._tls = self.__tls() or False
+        return self._tls or None
 
     def locate(self, addr, absolute=False):
         """
@@ -107,27 +153,59 @@ class PE(BinFormat):
         """
         if absolute:
             addr = addr - self.basemap
-        # now we have addr so we can see in which section/segment it is...
-        # sections are smaller than segments so we try first with Shdr
-        # but this may lead to errors because what really matters are segments
-        # loaded by the kernel binfmt_elf.c loader.
-        for s in self.sections:
-            if s.Characteristics == IMAGE_SCN_LNK_REMOVE:
-                continue
-            if s.RVA <= addr < s.RVA + s.VirtualSize:
-                return s, addr - s.RVA
+        # now we have addr so we can see in which section it is...
+        s = self.getsection(addr)
+        if s is not None:
+            return s, addr - s.RVA
         if 0 <= addr < self.Opt.SizeOfImage:
             return 0, addr
         logger.info("address not found (was %08x)" % addr)
         return None, 0
 
+    def _sections(self):
+        # sections are indexed by RVA, first sections take precedence:
+        return [
+            (s.RVA, s.RVA + s.VirtualSize, s)
+            for s in reversed(self.sections)
+            if s.Characteristics != IMAGE_SCN_LNK_REMOVE
+        ]
+
+    def getinfo(self, target):
+        """
+        returns a triplet (s,off,vaddr) with the section that contains
+        target virtual address, offset into the section, and section
+        virtual base address (or (None,0,0) if not found in any section.)
+        """
+        if isinstance(target, str):
+            target = self.getaddress(target)
+            if target is None:
+                return None, 0, 0
+        s = self.getsection(target - self.basemap)
+        if s is None:
+            return None, 0, 0
+        base = self.basemap + s.RVA
+        return s, target - base, base
+
     def getdata(self, addr, absolute=False):
         "get section bytes from given virtual address to end of mapped section."
+        data, offset = self.getsectiondata(addr, absolute)
+        return data[offset:]
+
+    def getsectiondata(self, addr, absolute=False):
+        """
+        returns the (cached) bytes of the section that holds addr and
+        the offset of addr within these bytes.
+        """
         s, offset = self.locate(addr, absolute)
         if s is None:
             logger.error("address not mapped")
             raise ValueError
-        return self.loadsegment(s, raw=True)[offset:]
+        key = s.RVA if s else -1
+        try:
+            data = self.__sdata[key]
+        except KeyError:
+            data = self.__sdata[key] = self.loadsegment(s, raw=True)
+        return data, offset
 
     def loadsegment(self, S, pagesize=0, raw=False):
         """
@@ -146,6 +224,11 @@ class PE(BinFormat):
             if sta % self.Opt.FileAlignment:
                 logger.warning("bad file alignment for section %s" % S.Name)
             sto = sta + S.SizeOfRawData
+            view = getattr(self.data, "view", None)
+            if view is not None and S.VirtualSize <= S.SizeOfRawData >= pagesize:
+                # no padding needed: map the file data without copy.
+                bytes_ = view[sta:sto]
+                return bytes(bytes_) if raw else {addr: bytes_}
             bytes_ = self.data[sta:sto].ljust(S.VirtualSize)
             if pagesize:
                 # note: bytes are not truncated, only extended if needed...
@@ -186,24 +269,23 @@ class PE(BinFormat):
             self.ImportTable = ImportTable(data)
             for e in self.ImportTable.dlls:
                 try:
-                    dllname = self.getdata(e.NameRVA)
-                    e.Name = str(dllname.partition(b"\0")[0].decode())
+                    e.Name = self.getstring(e.NameRVA)
                 except Exception:
                     logger.warning("invalid dll name RVA in ImportTable")
                 try:
                     if e.ImportLookupTableRVA != 0:
-                        data = self.getdata(e.ImportLookupTableRVA)
+                        data, o = self.getsectiondata(e.ImportLookupTableRVA)
                     else:
-                        data = self.getdata(e.ImportAddressTableRVA)
+                        data, o = self.getsectiondata(e.ImportAddressTableRVA)
                 except ValueError:
                     logger.warning("invalid ImportLookupTable RVA")
                 else:
-                    e.ImportLookupTable = ImportLookupTable(data, self.Opt.Magic)
+                    e.ImportLookupTable = ImportLookupTable(data, self.Opt.Magic, o)
                     e.ImportAddressTable = []
                     vaddr = e.ImportAddressTableRVA + self.basemap
                     for x in e.ImportLookupTable.imports:
                         if x[0] == 0:
-                            ref = NameTableEntry(self.getdata(x[1]))
+                            ref = NameTableEntry(*self.getsectiondata(x[1]))
                         else:
                             ref = "#%s" % str(x[1])  # ordinal case
                         e.ImportAddressTable.append((vaddr, ref))
@@ -217,6 +299,57 @@ class PE(BinFormat):
                         D[vaddr] = "%s::%s" % (e.Name, symbol)
         return D
 
+    def getstring(self, addr, absolute=False):
+        "returns the null-terminated string located at given address"
+        data, offset = self.getsectiondata(addr, absolute)
+        sto = data.find(b"\0", offset)
+        if sto < 0:
+            sto = len(data)
+        return str(data[offset:sto].decode())
+
+    def __exports(self):
+        D = {}
+        exports = self.Opt.DataDirectories.get("ExportTable", None)
+        if exports is None or exports.RVA == 0:
+            return D
+        try:
+            data, o = self.getsectiondata(exports.RVA)
+            self.ExportTable = T = ExportTable(data, o)
+            data, o = self.getsectiondata(T.ExportAddressTableRVA)
+            rvas = struct.unpack_from("<%dI" % T.AddressTableEntries, data, o)
+            n = T.NumberOfNamePointers
+            if n > 0:
+                data, o = self.getsectiondata(T.NamePointerRVA)
+                names = struct.unpack_from("<%dI" % n, data, o)
+                data, o = self.getsectiondata(T.OrdinalTableRVA)
+                ordinals = struct.unpack_from("<%dH" % n, data, o)
+                for rva, i in zip(names, ordinals):
+                    D[rvas[i] + self.basemap] = self.getstring(rva)
+        except (ValueError, struct.error, IndexError, UnicodeDecodeError):
+            logger.warning("invalid ExportTable")
+        return D
+
+    def __relocations(self):
+        L = []
+        relocs = self.Opt.DataDirectories.get("BaseRelocationTable", None)
+        if relocs is None or relocs.RVA == 0:
+            return L
+        try:
+            data, o = self.getsectiondata(relocs.RVA)
+            end = min(o + relocs.Size, len(data))
+            while o + 8 <= end:
+                page, size = struct.unpack_from("<II", data, o)
+                if size < 8:
+                    break
+                for e in struct.unpack_from("<%dH" % ((size - 8) // 2), data, o + 8):
+                    # type 0 (IMAGE_REL_BASED_ABSOLUTE) is only padding:
+                    if e >> 12:
+                        L.append((page + (e & 0xFFF), e >> 12))
+                o += size
+        except (ValueError, struct.error):
+            logger.warning("invalid BaseRelocationTable")
+        return L
+
     def __tls(self):
         tls = self.Opt.DataDirectories.get("TLSTable", None)
         if tls is not None and tls.RVA != 0:
@@ -931,17 +1064,18 @@ class ImportTableEntry(StructFormatter):
 
 
 class ImportLookupTable(object):
-    def __init__(self, data, magic):
+    def __init__(self, data, magic, offset=0):
         size = {0x20B: 64, 0x10B: 32}[magic]
         self.elsize = size // 8
-        self.fmt = "Q" if size == 64 else "I"
-        self.readimports(data)
+        self.fmt = "<Q" if size == 64 else "<I"
+        self.readimports(data, offset)
 
-    def readimports(self, data):
+    def readimports(self, data, offset=0):
         self.imports = []
         fshift = (self.elsize * 8) - 1
-        while len(data) >= self.elsize:
-            v = struct.unpack(self.fmt, data[: self.elsize])[0]
+        n = (len(data) - offset) // self.elsize
+        thunks = memoryview(data)[offset : offset + n * self.elsize]
+        for (v,) in struct.iter_unpack(self.fmt, thunks):
             if v == 0:
                 return
             flag = v >> fshift
@@ -949,15 +1083,16 @@ class ImportLookupTable(object):
                 self.imports.append([flag, v & 0xFFFF])
             elif flag == 0:
                 self.imports.append([flag, v & 0x7FFFFFFF])
-            data = data[self.elsize :]
 
 
 class NameTableEntry(object):
-    def __init__(self, data):
-        hint = struct.unpack("H", data[:2])
-        s, _, _ = data[2:].partition(b"\0")
+    def __init__(self, data, offset=0):
+        hint = struct.unpack_from("<H", data, offset)
+        sto = data.find(b"\0", offset + 2)
+        if sto < 0:
+            sto = len(data)
         self.hint = hint
-        self.symbol = str(s.decode())
+        self.symbol = str(data[offset + 2 : sto].decode())
 
 
 # ------------------------------------------------------------------------------
@@ -66,8 +66,7 @@ class RawExec(CoreExec):
             mz = m.mmap._zones[None]
             sta, sto = mz.range()
             delta = vaddr - sta
-            for z in mz._map:
-                z.vaddr += delta
+            mz.shift(delta)
             # force mmap cache update:
             m.restruct()
             # create _initmap with new pc as vaddr:
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+# This code is part of Amoco
+# Copyright (C) 2021 Axel Tillequin (bdcht3@gmail.com)
+# published under GPLv2 license
+
+"""
+system/snapshot.py
+==================
+
+This module implements snapshots of fully loaded tasks, allowing to
+restore a task (memory map, mapper state, OS and binary format symbols)
+without parsing and loading its binary program again.
+
+A snapshot file starts with a small header followed by a pickled
+description of the task. All raw bytes of the task's memory map are stored
+apart, in a page-aligned area at the end of the file, so that restored
+memory objects are memoryview slices of the memory-mapped snapshot.
+
+Example:
+
+    >>> p = load_program("prog.elf")
+    >>> snapshot.save(p, "prog.snap")
+    >>> q = snapshot.restore("prog.snap")
+"""
+
+import importlib
+import io
+import mmap
+import os
+import pickle
+import struct
+from collections import OrderedDict
+
+from amoco.cas.expressions import reg, ext
+from amoco.system.memory import datadiv
+from amoco.system.utils import filehash
+from amoco.logger import Log
+
+logger = Log(__name__)
+logger.debug("loading module")
+
+MAGIC = b"AMOCOSNP"
+VERSION = 2
+_header = struct.Struct("<8sIIQQ")
+_ALIGN = mmap.ALLOCATIONGRANULARITY
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _Pickler(pickle.Pickler):
+    """
+    Pickler that pickles cpu registers and external symbols by reference,
+    and optionally (if raw is True) stores raw bytes of datadiv objects in
+    a separate blob.
+    """
+
+    def __init__(self, f, cpu, raw=True):
+        super().__init__(f, pickle.HIGHEST_PROTOCOL)
+        self.raw = raw
+        self.blobs = []
+        self.size = 0
+        self.seen = {}
+        self.regs = {}
+        if cpu is not None:
+            for k, v in vars(cpu).items():
+                if isinstance(v, reg) and not isinstance(v, ext):
+                    self.regs.setdefault(id(v), k)
+
+    def persistent_id(self, obj):
+        if self.raw and isinstance(obj, datadiv) and obj._is_raw:
+            r = self.seen.get(id(obj), None)
+            if r is None:
+                val = obj.val
+                r = ("raw", self.size, len(val), obj.endian)
+                self.blobs.append(val)
+                self.size += len(val)
+                self.seen[id(obj)] = r
+            return r
+        if isinstance(obj, ext):
+            return ("ext", obj.__class__, obj.ref, obj._subrefs, obj.sf)
+        if isinstance(obj, reg) and id(obj) in self.regs:
+            return ("reg", self.regs[id(obj)])
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, f, view, cpu, OS):
+        super().__init__(f)
+        self.view = view
+        self.cpu = cpu
+        self.OS = OS
+
+    def persistent_load(self, pid):
+        if pid[0] == "raw":
+            _, off, size, endian = pid
+            return datadiv(self.view[off : off + size], endian)
+        if pid[0] == "ext":
+            _, cls, ref, subrefs, sf = pid
+            x = cls(ref, **subrefs)
+            x.sf = sf
+            if self.OS is not None and hasattr(self.OS, "stub"):
+                x.stub = self.OS.stub(ref)
+            return x
+        if pid[0] == "reg":
+            return getattr(self.cpu, pid[1])
+        raise pickle.UnpicklingError("unknown persistent id %s" % repr(pid))
+
+
+def dumps(obj, cpu):
+    """
+    returns the pickled bytes of obj, where registers of the cpu module
+    and external symbols are pickled by reference (see :func:`loads`).
+    """
+    f = io.BytesIO()
+    _Pickler(f, cpu, raw=False).dump(obj)
+    return f.getvalue()
+
+
+def loads(data, cpu, OS=None):
+    """
+    returns the object unpickled from data (see :func:`dumps`), where
+    registers are those of the cpu module and external symbols stubs are
+    provided by OS.
+    """
+    return _Unpickler(io.BytesIO(data), None, cpu, OS).load()
+
+
+def _filename(p):
+    try:
+        return os.path.abspath(p.bin.filename)
+    except (AttributeError, TypeError):
+        return None
+
+
+def _binid(filename):
+    "returns the (size, mtime, SHA-256) identity of the binary file, or None"
+    if filename is None or not os.path.isfile(filename):
+        return None
+    st = os.stat(filename)
+    return (st.st_size, st.st_mtime_ns, filehash(filename))
+
+
+def save(p, filename):
+    """
+    writes a snapshot of task p in file filename.
+    The task's binary program is not stored: it is referenced by its
+    filename (and identified by its size, mtime and SHA-256) and re-opened
+    (but not loaded) when the snapshot is restored.
+    """
+    B = p.bin
+    desc = {
+        "task": p.__class__,
+        "cpu": p.cpu.__name__ if p.cpu is not None else None,
+        "bin": _filename(p),
+        "binid": _binid(_filename(p)),
+        "symbols": None,
+        "os": None,
+        "extra": dict(getattr(p, "__dict__", {})),
+    }
+    if hasattr(B, "_symbols"):
+        desc["symbols"] = B._symbols_index or B._symbols()
+    if p.OS is not None:
+        S = dict(vars(p.OS))
+        S.pop("tasks", None)
+        desc["os"] = (p.OS.__class__, S)
+    f = io.BytesIO()
+    P = _Pickler(f, p.cpu)
+    P.dump(desc)
+    # the OS is pickled first so that external symbols stubs can be
+    # restored by the unpickler of the state:
+    P.dump(p.state)
+    meta = f.getvalue()
+    start = _header.size + len(meta)
+    start += -start % _ALIGN
+    with open(filename, "wb") as fd:
+        fd.write(_header.pack(MAGIC, VERSION, 0, start, len(meta)))
+        fd.write(meta)
+        fd.seek(start)
+        for b in P.blobs:
+            fd.write(b)
+        fd.truncate(start + P.size)
+    logger.info("task snapshot saved in %s" % filename)
+
+
+def restore(filename):
+    """
+    returns the task restored from the snapshot file filename.
+    Raw bytes of the restored memory map are not copied: they are
+    memoryview slices of the memory-mapped snapshot file.
+    Raises :exc:`SnapshotError` if the binary program has changed since
+    the snapshot was saved.
+    """
+    from amoco.system.core import read_program
+
+    with open(filename, "rb") as fd:
+        magic, version, _, start, size = _header.unpack(fd.read(_header.size))
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(filename)
+        meta = fd.read(size)
+        m = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(m)[start:]
+    f = io.BytesIO(meta)
+    U = _Unpickler(f, view, None, None)
+    desc = U.load()
+    cpu = U.cpu = importlib.import_module(desc["cpu"]) if desc["cpu"] else None
+    p = object.__new__(desc["task"])
+    p.cpu = cpu
+    p.OS = None
+    if desc["os"] is not None:
+        cls, S = desc["os"]
+        p.OS = U.OS = object.__new__(cls)
+        vars(p.OS).update(S)
+        p.OS.tasks = [p]
+    p.state = U.load()
+    p.bin = None
+    if desc["binid"] is not None and os.path.isfile(desc["bin"]):
+        size, mtime, h = desc["binid"]
+        st = os.stat(desc["bin"])
+        # the binary is hashed again only if it has been touched:
+        if st.st_size != size or (
+            st.st_mtime_ns != mtime and filehash(desc["bin"]) != h
+        ):
+            raise SnapshotError("%s: binary %s has changed" % (filename, desc["bin"]))
+        p.bin = read_program(desc["bin"])
+        if desc["symbols"] is not None:
+            p.bin._symbols_index = desc["symbols"]
+    elif desc["binid"] is not None:
+        logger.warning("binary program %s not found" % desc["bin"])
+    p.icache = OrderedDict()
+    if desc["extra"]:
+        vars(p).update(desc["extra"])
+    return p
@@ -404,10 +404,7 @@ class RawField(Field):
         return sz
 
     def unpack(self, data, offset=0):
-        pfx = "%d" % self.count if self.count > 0 else ""
-        res = struct.unpack(
-            self.order + pfx + self.typename, data[offset : offset + self.size()]
-        )
+        res = _unpack_from(_struct(self.order + self.format()), data, offset)
         if self.count == 0 or self.typename == "s":
             return res[0]
         if self.typename == "c":
@@ -549,6 +546,84 @@ class CntField(RawField):
 # ------------------------------------------------------------------------------
 
 
+_Structs = {}
+
+
+def _struct(fmt):
+    "returns the (cached) struct.Struct object for format fmt"
+    try:
+        return _Structs[fmt]
+    except KeyError:
+        S = _Structs[fmt] = struct.Struct(fmt)
+        return S
+
+
+def _unpack_from(S, data, offset=0):
+    "unpacks data at offset with S, slicing data only if it is not a buffer"
+    try:
+        return S.unpack_from(data, offset)
+    except TypeError:
+        return S.unpack(data[offset : offset + S.size])
+
+
+_Codecs = {}
+
+
+def compile_fields(fields, packed=False):
+    """
+    Returns a (struct.Struct, plan) tuple that decodes all given fields
+    with a single unpack_from call, or None if some field is not a fixed
+    size RawField with the same byte ordering. The plan is the list of
+    (name, start, stop, kind) slices of the unpacked values associated
+    to each field name.
+    """
+    try:
+        key = (packed,) + tuple(
+            (f.__class__, f.name, f.typename, f.count, f.order, f._align_value)
+            for f in fields
+        )
+        return _Codecs[key]
+    except KeyError:
+        pass
+    except TypeError:
+        return None
+    codec = None
+    if fields and all((f.__class__ is RawField) for f in fields):
+        order = fields[0].order
+        fmt = []
+        plan = []
+        offset = 0
+        i = 0
+        for f in fields:
+            if f.order != order or f.typename == "x":
+                break
+            if not isinstance(f.count, int):
+                break
+            if not packed:
+                pad = f.align(offset) - offset
+                if pad > 0:
+                    fmt.append("%dx" % pad)
+                    offset += pad
+            fmt.append(f.format())
+            offset += f.size()
+            if f.count == 0 or f.typename == "s":
+                plan.append((f.name, i, i + 1, 0))
+                i += 1
+            else:
+                plan.append((f.name, i, i + f.count, 2 if f.typename == "c" else 1))
+                i += f.count
+        else:
+            try:
+                codec = (_struct(order + "".join(fmt)), plan)
+            except struct.error:
+                codec = None
+    _Codecs[key] = codec
+    return codec
+
+
+# ------------------------------------------------------------------------------
+
+
 class StructDefine(object):
     """
     StructDefine is a decorator class used for defining structures
@@ -644,6 +719,7 @@ class StructDefine(object):
         cls.source = self.source
         cls.packed = self.packed
         cls.fkeys = defaultdict(default_formatter)
+        compile_fields(cls.fields, cls.packed)
         return cls
 
 
@@ -683,6 +759,43 @@ def TypeDefine(newname, typebase, typecount=0, align_value=0):
 # ------------------------------------------------------------------------------
 
 
+#------------------------------------------------------------------------------
+
+class _SharedFields(list):
+    """
+    list of fields shared by the structures decoded by
+    :meth:`StructCore.iter_unpack`. Fields are copied (once) on first access
+    of an item so that a structure never modifies the fields of another.
+    """
+
+    _shared = True
+
+    def _own(self):
+        if self._shared:
+            self._shared = False
+            for i, f in enumerate(list.__iter__(self)):
+                list.__setitem__(self, i, f.copy())
+
+    def __getitem__(self, i):
+        self._own()
+        return list.__getitem__(self, i)
+
+    def __iter__(self):
+        self._own()
+        return list.__iter__(self)
+
+    def __reversed__(self):
+        self._own()
+        return list.__reversed__(self)
+
+    def pop(self, *args):
+        self._own()
+        return list.pop(self, *args)
+
+    def __reduce__(self):
+        return (list, (list(list.__iter__(self)),))
+
+
 #------------------------------------------------------------------------------
 
 class StructCore(object):
@@ -760,6 +873,13 @@ class StructCore(object):
         return max([f.align_value for f in cls.fields])
 
     def unpack(self, data, offset=0):
+        codec = None
+        if self.union is False:
+            codec = compile_fields(self.fields, self.packed)
+        if codec is not None:
+            S, plan = codec
+            self._setvalues(plan, _unpack_from(S, data, offset))
+            return self
         for f in self.fields:
             if self.union is False and not self.packed:
                 offset = f.align(offset)
@@ -768,6 +888,62 @@ class StructCore(object):
                 offset += f.size()
         return self
 
+    def _setvalues(self, plan, res):
+        v = self._v.__dict__
+        for name, i, j, kind in plan:
+            if kind == 0:
+                v[name] = res[i]
+            elif kind == 1:
+                v[name] = res[i:j]
+            else:
+                v[name] = b"".join(res[i:j])
+
+    def iter_unpack(self, data, offset=0, count=None, stride=0):
+        """
+        Yields count structures of the same class and fields as this one,
+        decoded from consecutive records of data starting at offset and
+        separated by stride bytes (defaults to the structure size).
+        If count is None, records are decoded up to the end of data.
+        """
+        cls = self.__class__
+        fields = self.fields
+        sz = self.size()
+        stride = stride or sz
+        if count is None:
+            count = max(0, (len(data) - offset - sz) // stride + 1)
+        try:
+            memoryview(data)
+        except TypeError:
+            data = data[offset : offset + count * stride]
+            offset = 0
+        codec = None
+        if self.union is False:
+            codec = compile_fields(fields, self.packed)
+        t = type("container", (object,), {})
+        if codec is not None:
+            S, plan = codec
+            if stride == S.size:
+                values = S.iter_unpack(
+                    memoryview(data)[offset : offset + count * stride]
+                )
+            else:
+                values = (
+                    S.unpack_from(data, o)
+                    for o in range(offset, offset + count * stride, stride)
+                )
+            for res in values:
+                obj = object.__new__(cls)
+                obj.fields = _SharedFields(fields)
+                obj._v = t()
+                obj._setvalues(plan, res)
+                yield obj
+        else:
+            for o in range(offset, offset + count * stride, stride):
+                obj = object.__new__(cls)
+                obj.fields = [f.copy() for f in fields]
+                obj._v = t()
+                yield StructCore.unpack(obj, data, o)
+
     def pack(self, data=None):
         if data is None:
             data = [getattr(self._v, f.name) for f in self.fields]
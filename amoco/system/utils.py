@@ -10,8 +10,12 @@ system/utils.py
 
 The system utils module implements various binary file format like
 Intel HEX or Motorola SREC, commonly used for programming MCU, EEPROMs, etc.
+Records are decoded while the file is read (see :func:`hexrecords` and
+:func:`srecords`) and contiguous data records are merged into larger runs
+of bytes (see :func:`coalesce`) that are written at once in memory.
 """
 
+import hashlib
 import struct
 from amoco.system.core import DataIO, BinFormat
 from amoco.logger import Log
@@ -86,18 +90,91 @@ with Consts("HEXcode"):
 # ------------------------------------------------------------------------------
 
 
+def coalesce(records):
+    """
+    Merges contiguous (address, data) records into a list of larger
+    (address, bytes) runs, preserving the order of non-contiguous ones.
+    """
+    runs = []
+    run = None
+    start = end = None
+    for address, data in records:
+        if not data:
+            continue
+        if run is not None and address == end:
+            run += data
+        else:
+            if run is not None:
+                runs.append((start, bytes(run)))
+            run = bytearray(data)
+            start = address
+        end = address + len(data)
+    if run is not None:
+        runs.append((start, bytes(run)))
+    return runs
+
+
+def hexrecords(lines):
+    """
+    Decodes Intel HEX lines and yields (HEXcode, address, data) records.
+    Each line is converted with a single bytes.fromhex call and its
+    checksum is verified on the resulting bytes.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            assert line[0:1] == b":"
+            raw = bytes.fromhex(line[1:].decode())
+            assert len(raw) == raw[0] + 5
+            assert sum(raw) & 0xFF == 0
+        except (AssertionError, ValueError, IndexError):
+            raise FormatError(line)
+        yield (raw[3], (raw[1] << 8) | raw[2], raw[4:-1])
+
+
 class HEX(BinFormat):
     def __init__(self, f, offset=0):
-        self.L = []
+        self.__file = f
         self._filename = f.name
         self._entrypoint = 0
-        for line in f.readlines():
-            l = HEXline(line)
-            if l.HEXcode == StartSegmentAddress:
-                self._entrypoint = (l.cs, l.ip)
-            elif l.HEXcode == StartLinearAddress:
-                self.entrypoint = l.eip
-            self.L.append(l)
+        self.mem = coalesce(self.__data(hexrecords(iter(f.readline, b""))))
+
+    def __data(self, records):
+        seg = 0
+        ela = 0
+        for code, address, data in records:
+            if code == Data:
+                if ela:
+                    address = (ela << 16) + address
+                elif seg:
+                    address = (seg * 16) + address
+                yield (address, data)
+                continue
+            v = int.from_bytes(data, "big")
+            if code in (ExtendedSegmentAddress, ExtendedLinearAddress):
+                if len(data) != 2:
+                    raise FormatError(data)
+                if code == ExtendedSegmentAddress:
+                    seg = v
+                else:
+                    ela = v
+            elif code in (StartSegmentAddress, StartLinearAddress):
+                if len(data) != 4:
+                    raise FormatError(data)
+                if code == StartSegmentAddress:
+                    self._entrypoint = (v >> 16, v & 0xFFFF)
+                else:
+                    self.entrypoint = v
+            elif code == EndOfFile:
+                break
+
+    @property
+    def L(self):
+        "list of all HEXline objects (decoded again from the file)"
+        self.__file.seek(0)
+        return [HEXline(line) for line in self.__file.readlines()]
 
     @property
     def entrypoints(self):
@@ -108,26 +185,11 @@ class HEX(BinFormat):
         return self._filename
 
     def load_binary(self, mmap=None):
-        seg = 0
-        ela = 0
-        mem = []
-        for l in self.L:
-            if l.HEXcode == ExtendedSegmentAddress:
-                seg = l.base
-            elif l.HEXcode == ExtendedLinearAddress:
-                ela = l.ela
-            elif l.HEXcode == Data:
-                if ela:
-                    address = (ela << 16) + l.address
-                elif seg:
-                    address = (seg * 16) + l.address
-                else:
-                    address = l.address
-                mem.append((address, l.data))
+        "returns the list of (address, bytes) runs, written into mmap if given"
         if mmap is not None:
-            for k, v in mem:
+            for k, v in self.mem:
                 mmap.write(k, v)
-        return mem
+        return self.mem
 
     def __str__(self):
         return "\n".join((str(l) for l in self.L))
@@ -220,23 +282,54 @@ with Consts("SREC"):
 # ------------------------------------------------------------------------------
 
 
+def srecords(lines):
+    """
+    Decodes Motorola SREC lines and yields (SRECtype, address, data)
+    records. Each line is converted with a single bytes.fromhex call and
+    its checksum is verified on the resulting bytes.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            assert line[0:1] == b"S"
+            t = int(line[1:2], 10)
+            raw = bytes.fromhex(line[2:].decode())
+            l = (2, 2, 3, 4, 0, 2, 3, 4, 3, 2)[t]
+            assert len(raw) == raw[0] + 1 and raw[0] > l
+            assert sum(raw) & 0xFF == 0xFF
+        except (AssertionError, ValueError, IndexError):
+            raise FormatError(line)
+        yield (t, int.from_bytes(raw[1 : l + 1], "big"), raw[l + 1 : -1])
+
+
 class SREC(BinFormat):
     def __init__(self, f, offset=0):
-        self.L = []
+        self.__file = f
         self._entrypoint = 0
         self._filename = f.name
-        for line in f.readlines():
-            count = 0
-            l = SRECline(line)
-            if l.SRECtype == Header:
-                self.name = l.data
-            elif l.SRECtype in (Start16, Start24, Start32):
-                self.entrypoint = l.address
-            elif l.SRECtype in (Count16, Count24):
-                assert count == l.address
-            else:
+        self.mem = coalesce(self.__data(srecords(iter(f.readline, b""))))
+
+    def __data(self, records):
+        count = 0
+        for t, address, data in records:
+            if t in (Data16, Data24, Data32):
                 count += 1
-            self.L.append(l)
+                yield (address, data)
+            elif t == Header:
+                self.name = data
+            elif t in (Start16, Start24, Start32):
+                self.entrypoint = address
+            elif t in (Count16, Count24):
+                if count != address:
+                    logger.warning("SREC count mismatch (%d records)" % count)
+
+    @property
+    def L(self):
+        "list of all SRECline objects (decoded again from the file)"
+        self.__file.seek(0)
+        return [SRECline(line) for line in self.__file.readlines()]
 
     @property
     def entrypoints(self):
@@ -247,13 +340,11 @@ class SREC(BinFormat):
         return self._filename
 
     def load_binary(self, mmap=None):
-        mem = []
-        for l in self.L:
-            mem.append((l.address, l.data))
-        if mmap:
-            for (k, v) in mem:
+        "returns the list of (address, bytes) runs, written into mmap if given"
+        if mmap is not None:
+            for (k, v) in self.mem:
                 mmap.write(k, v)
-        return mem
+        return self.mem
 
     def __str__(self):
         return "\n".join((str(l) for l in self.L))
@@ -320,11 +411,12 @@ class SRECline(object):
             return "[%s] %s" % (h, token_address_fmt(None, self.address))
 
 
-def read_leb128(data, sign=1):
+def read_leb128(data, sign=1, offset=0):
     result = 0
     shift = 0
     count = 0
-    for b in data:
+    for i in range(offset, len(data)):
+        b = data[i]
         if isinstance(b, bytes):
             b = ord(b)
         count += 1
@@ -337,9 +429,21 @@ def read_leb128(data, sign=1):
     return result, count
 
 
-def read_uleb128(data):
-    return read_leb128(data)
+def read_uleb128(data, offset=0):
+    return read_leb128(data, 1, offset)
+
+
+def read_sleb128(data, offset=0):
+    return read_leb128(data, -1, offset)
 
 
-def read_sleb128(data):
-    return read_leb128(data, -1)
+def filehash(f):
+    "returns the SHA-256 hex digest of the file (or bytes) f"
+    h = hashlib.sha256()
+    if isinstance(f, (bytes, bytearray, memoryview)):
+        h.update(f)
+    else:
+        with open(f, "rb") as fd:
+            for chunk in iter(lambda: fd.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
@@ -297,8 +297,7 @@ class DwarfExec(CoreExec):
 
         m = mapper()
         mz = self.mmap._zones[None]
-        for z in mz._map:
-            z.vaddr += vaddr
+        mz.shift(vaddr)
         # force mmap cache update:
         self.mmap.restruct()
         # create _initmap with new pc as vaddr:
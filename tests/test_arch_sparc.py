@@ -104,3 +104,31 @@ def test_parser_002b():
   print("- %r"%i)
   assert i.mnemonic == 'add'
   assert str(i) == 'inc  0x42, %g1'
+
+def test_decoder_tables():
+  d = cpu.disassemble
+  assert len(d.tables)==len(d.specs)
+  c = b'\x9d\xe3\xbf\x98'
+  i = cpu.disassemble(c)
+  assert not i.spec.bits
+  # candidates are rejected by the tables for a truncated input:
+  assert cpu.disassemble(c[:2]) is None
+
+def test_decoder_cache(tmp_path):
+  from amoco.config import conf
+  from amoco.arch import core
+  from amoco.arch.sparc import spec_v8
+  conf.Arch.cache = str(tmp_path)
+  try:
+    d = core.disassembler([spec_v8], endian=lambda: -1, iclass=cpu.instruction_sparc)
+    f = core.specs_cache_file()
+    assert f.startswith(str(tmp_path))
+    core.SPECS_CACHE.update(formats={}, trees={}, file=None)
+    d = core.disassembler([spec_v8], endian=lambda: -1, iclass=cpu.instruction_sparc)
+    assert not core.SPECS_CACHE['dirty']
+    assert len(core.SPECS_CACHE['trees'])>0
+    i = d(b'\x9d\xe3\xbf\x98')
+    assert i.mnemonic == 'save'
+  finally:
+    conf.Arch.cache = ''
+    core.SPECS_CACHE['file'] = None
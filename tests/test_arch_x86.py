@@ -530,3 +530,17 @@ def test_asm_033(map):
   assert map(esp)==0x67452301-4
   assert map(mem(esp,32))==cst(0x67452301,32)
 
+
+# safe_update: push eax ; mov al,[esp+1] ; pop ebx
+def test_asm_034(map):
+  from amoco.cas.mapper import mapper
+  m = mapper()
+  m[esp] = cst(0x1000,32)
+  m[eax] = cst(0x67452301,32)
+  m[ebx] = ecx
+  for c in (b'\x50', b'\x8a\x44\x24\x01', b'\x5b'):
+    m.safe_update(cpu.disassemble(c,address=0))
+  assert m(esp)==0x1000
+  assert m(eax)==0x67452323
+  assert m(ebx)==0x67452301
+  assert m(mem(esp-4,16))==0x2301
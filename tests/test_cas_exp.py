@@ -159,6 +159,40 @@ def test_top(r):
     assert t^r[0:8] == t
     assert (t==3) == top(1)
 
+def test_hash(a,b):
+    e = (a+b)^cst(3,32)
+    assert hash(e)==hash((a+b)^cst(3,32))
+    assert hash(e)!=hash((a+b)^cst(4,32))
+    assert hash(a[0:8])==hash(slc(a,0,8,ref='al'))
+    x = op('+',a,b)
+    h = hash(x)
+    x.r = cst(1,32)
+    assert hash(x)!=h
+    assert x==a+1
+    m = mem(a,32,disp=4)
+    h = hash(m)
+    m.a.disp += 4
+    assert hash(m)!=h
+    assert m==mem(a,32,disp=8)
+
+def test_hash_negative_disp(a):
+    # hash(-1)==hash(-2) in CPython: equality must not rely on hashes only.
+    m1 = mem(a,32,disp=-1)
+    m2 = mem(a,32,disp=-2)
+    assert not (m1==m2)
+    assert not (m1-m2)._is_cst
+    assert (m1-mem(a,32,disp=-1)) == 0
+    assert not (cst(-1,32)+a == cst(-2,32)+a)
+    for r in (m1!=m2, m1<m2, m1<=m2, m1>m2, m1>=m2):
+        assert r._is_eqn
+    assert (m1!=m1)==bit0 and (m1>=mem(a,32,disp=-1))==bit1
+    # hash of parent expressions follows in place updates of children:
+    x = m1+a
+    h = hash(x)
+    m1.a.disp = -3
+    assert hash(x)!=h
+    assert x==mem(a,32,disp=-3)+a
+
 def pickler(obj):
     return pickle.dumps(obj,pickle.HIGHEST_PROTOCOL)
 
@@ -223,3 +257,8 @@ def test_pickle_vec(a,b):
     assert y.l[0] == a
     assert y.l[1] == -b
 
+def test_pickle_hash(a):
+    x = (a+1)&a
+    h = hash(x)
+    y = pickle.loads(pickler(x))
+    assert hash(y)==h
@@ -58,3 +58,155 @@ def test_func(ploop):
     assert y.blocks==f.blocks
     assert y.support==f.support
     #assert cfg.signature(y.cfg) == sig
+
+def test_analysis_cache(ploop, tmp_path):
+    from amoco.sa.cache import AnalysisCache
+    c = AnalysisCache(str(tmp_path))
+    p = amoco.load_program(ploop)
+    G = fforward(p, cache=c).getcfg()
+    assert len(c.cfgs) == 1 and c.dirty is False
+    E = sorted(e.name for e in G.E())
+    # a new cache is loaded from the cache file:
+    c = AnalysisCache(str(tmp_path))
+    p = amoco.load_program(ploop)
+    z = fforward(p, cache=c)
+    G = z.getcfg()
+    assert sorted(e.name for e in G.E()) == E
+    assert any(v._map is not None for v in G.V())
+    b = c.getblock(p, 0x804849d)
+    assert b.address == 0x804849d
+    assert b == next(lsweep(p).iterblocks(b.address))
+    # registers are restored by reference:
+    assert any(o is p.cpu.esp for o in b.instr[1].operands)
+    m = c.getmap(p, b)
+    assert any(l is p.cpu.esp for (l, _) in m)
+    # callers get their own instructions and mappers:
+    assert c.getblock(p, 0x804849d).instr[0] is not b.instr[0]
+    n = c.getmap(p, b)
+    assert n is not m and str(n) == str(m)
+    # cached blocks are not used if mapped bytes have changed:
+    p.state.mmap.write(0x804849d, b"\x90")
+    assert c.getblock(p, 0x804849d) is None
+
+def test_parallel(ploop):
+    from amoco.sa.parallel import parallel
+    p = amoco.load_program(ploop)
+    z = parallel(p, processes=2)
+    S = z.seeds()
+    e = p.bin.entrypoints[0]
+    assert e in S
+    S = [e, 0x804849d]
+    G = z.getcfg(S)
+    names = set(v.name for v in G.V())
+    g = fforward(amoco.load_program(ploop)).getcfg()
+    assert names.issuperset(v.name for v in g.V())
+    for a in S:
+        n = G.get_by_name("blck_%#x" % a)
+        assert n is not None
+    assert z.failed == {}
+    z.merge([(0x1234, "MemoryError: 0x1234")])
+    assert z.failed == {0x1234: "MemoryError: 0x1234"}
+
+def test_parallel_overlap(tmp_path):
+    from amoco.sa import parallel as par
+    from amoco.system import snapshot
+    # seed 0 reaches 0x12 (cutting blck_0x10), seed 0x20 jumps to 0x10:
+    c = b"\x74\x0e\xeb\x0e" + b"\x90"*12 + b"\x40\x40\xeb\x1c" + b"\x90"*12
+    c += b"\xeb\xee" + b"\x90"*14 + b"\xc3" + b"\x90"*15
+    p = amoco.load_program(c)
+    p.use_x86()
+    def check(G):
+        n = G.get_by_name("blck_0x10")
+        assert len(n) == 2
+        assert [v.name for v in n.N(+1)] == ["blck_0x12"]
+        assert G.get_by_name("blck_0x20").e_to(n) is not None
+    check(par.parallel(p, processes=1).getcfg([0, 0x20]))
+    # the merged graph does not depend on the order of components:
+    f = str(tmp_path / "p.snap")
+    snapshot.save(p, f)
+    par._init(f, fforward, frozenset([0, 0x20]))
+    R = [par._recover(0x20), par._recover(0)]
+    par._worker.clear()
+    check(par.parallel(p, processes=1).merge(R))
+
+def test_checkpoint(ploop, tmp_path):
+    ck = str(tmp_path / "cfg.ckpt")
+    p = amoco.load_program(ploop)
+    E = sorted(e.name for e in fforward(p).getcfg().E())
+    # a budget-limited recovery is saved, and resumed without budget:
+    z = fforward(p)
+    z.policy = dict(z.policy, budget=3)
+    G = z.getcfg(checkpoint=ck)
+    assert len(z.spool) == 0 and len(z.spool.heap) > 0
+    n = G.order()
+    z = fforward(p)
+    G = z.getcfg(checkpoint=ck)
+    assert G.order() > n
+    assert sorted(e.name for e in G.E()) == E
+    assert z.spool.total > 3
+    # a checkpoint is not resumed for another start address or program:
+    from amoco.sa.checkpoint import CheckpointError
+    with pytest.raises(CheckpointError):
+        fforward(p).getcfg(p.cpu.cst(0x804849d,32), checkpoint=ck)
+    q = amoco.load_program(b"\x40\xc3")
+    q.use_x86()
+    with pytest.raises(CheckpointError):
+        fforward(q).getcfg(checkpoint=ck)
+
+def test_fbackward_summaries():
+    # chain of blocks ending with a ret (inc eax; push ebx; pop ebx; jnz +1; ret):
+    p = amoco.load_program(b"\x40\x53\x5b\x75\x01\xc3"*8 + b"\xc3")
+    p.use_x86()
+    z = fbackward(p)
+    G = z.getcfg(p.cpu.cst(0,32))
+    assert G.order() == 17
+    # shared suffixes of first-parent paths are evaluated once:
+    S = z.summaries[G.C[0]]
+    assert len(S) < 3*G.order()
+    n = G.get_by_name("blck_0x6")
+    r = S[(n,p.cpu.mem(p.cpu.esp,32)._hkey())]
+    assert r[0] is n.map
+    assert z.pcpath(n,p.cpu.mem(p.cpu.esp,32)) is r[1]
+    assert (n,p.cpu.mem(p.cpu.esp,32,disp=-1)._hkey()) not in S
+    # summaries are reset by a new run:
+    z.getcfg(p.cpu.cst(0x30,32))
+    assert G.C[0] not in z.summaries
+
+def test_fbackward_aliasing():
+    from amoco.config import conf
+    # push ebp; mov [eax],ebx; pop ebp; ret:
+    p = amoco.load_program(b"\x55\x89\x18\x5d\xc3")
+    p.use_x86()
+    z = fbackward(p)
+    alf = conf.Cas.noaliasing
+    conf.Cas.noaliasing = False
+    try:
+        G = z.getcfg(p.cpu.cst(0,32))
+    finally:
+        conf.Cas.noaliasing = alf
+    n = G.get_by_name("blck_0x0")
+    assert n.misc["func"] is not None
+    # mods of the func pc are not stripped from the memoized pc:
+    _, y = z.summaries[n.c][(n, p.cpu.PC()._hkey())]
+    assert len(y.mods) > 0
+
+def test_graph_index():
+    p = amoco.load_program(b"\x40\x40\x75\x00\xc3")
+    p.use_x86()
+    z = lsweep(p)
+    G = cfg.graph()
+    n0 = G.add_vertex(cfg.node(next(z.iterblocks(p.cpu.cst(0,32)))))
+    assert len(n0) == 4
+    assert G.get_with_address(p.cpu.cst(3,32)) is n0
+    # a block starting inside n0 cuts it:
+    n1 = G.add_vertex(cfg.node(next(z.iterblocks(p.cpu.cst(1,32)))))
+    assert len(n0) == 1 and n0.misc["cut"]
+    assert G.support.addr == [0, 1]
+    assert G.get_with_address(p.cpu.cst(3,32)) is n1
+    assert G.get_by_name("blck_0x1") is n1
+    assert n1 in n0.N(+1)
+    n4 = cfg.node(next(z.iterblocks(p.cpu.cst(4,32))))
+    G.add_edge(cfg.link(n1, n4))
+    assert G.remove_vertex(n4) is n4
+    assert G.get_by_name("blck_0x4") is None
+    assert G.get_with_address(p.cpu.cst(4,32)) is None
@@ -0,0 +1,64 @@
+import pytest
+
+from amoco.system.raw import RawExec
+from amoco.system.core import DataIO
+from amoco.arch.x86 import cpu_x86 as cpu
+from amoco.emu import emul
+
+# mov ecx,0x10 ; xor eax,eax ; l: add eax,ecx ; push eax ; pop ebx ;
+# mov [ebx+0x8000],cl ; dec ecx ; jnz l ; hlt
+code = bytes.fromhex("b910000000" "31c0" "01c8" "50" "5b" "888b00800000" "49" "75f3" "f4")
+
+def task():
+    p = RawExec(DataIO(code), cpu)
+    p.state.mmap.write(0x8000, b"\0"*0x1000)
+    p.state[cpu.esp] = cpu.cst(0x8800,32)
+    return p
+
+def run(e,it):
+    for _ in it:
+        if e.task.getx(cpu.eip)==len(code)-1: break
+    return [e.task.getx(r) for r in (cpu.eax,cpu.ebx,cpu.ecx,cpu.esp)]
+
+def test_emul_blocks():
+    e1 = emul(task())
+    e2 = emul(task())
+    assert run(e2,e2.iterblocks()) == run(e1,e1.iterate())
+    assert e2.task.getx(0x8000+136) == 1
+    assert e1.task.getx(0x8000+136) == 1
+    assert len(e2.tbcache) == 2
+
+def test_emul_smc():
+    e = emul(task())
+    # map the code without copy, as for a program file:
+    e.task.state.mmap.write(0, memoryview(code))
+    b = e.stepb()
+    assert b.address == 0 and len(b) == 20
+    b = e.stepb()
+    assert b.address == 7 and len(b) == 13
+    assert e.task.getx(cpu.ecx) == 0xe
+    # patch "dec ecx" into "dec ebx":
+    e.task.state.mmap.write(17, b"\x4b")
+    b = e.stepb()
+    assert str(b.instr[4].operands[0]) == 'ebx'
+    assert e.task.getx(cpu.ecx) == 0xe
+    # the patched block is translated once:
+    assert len(e.task.state.mmap.read(7, len(b))) > 1
+    tb = e.tbcache[7]
+    assert e.stepb().address == 7
+    assert e.tbcache[7] is tb
+
+def test_compile_block():
+    from amoco.emu import compile_block
+    # mov [eax],ecx ; mov edx,[ebx] ; ret
+    b = [cpu.disassemble(c) for c in (b"\x89\x08", b"\x8b\x13", b"\xc3")]
+    run = compile_block(b)
+    p = task()
+    p.state[cpu.eax] = cpu.cst(0x8100,32)
+    p.state[cpu.ebx] = cpu.cst(0x8100,32)
+    p.state[cpu.ecx] = cpu.cst(0xcafe,32)
+    assert run(p.state) is False
+    p.state[cpu.ebx] = cpu.cst(0x8104,32)
+    assert run(p.state) is True
+    assert p.getx(cpu.edx) == 0
+    assert p.getx(0x8100,32) == 0xcafe
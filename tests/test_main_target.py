@@ -40,3 +40,39 @@ def test_002(ploop):
     z.update_spool(n1,n0)
     assert len(z.spool)==2
 
+
+def test_worklist(ploop):
+    c = amoco.cas.expressions.cst
+    wl = sa.worklist("fan-in")
+    assert wl.push(sa.target(c(0x1000,32),None))
+    assert not wl.push(sa.target(c(0x1000,32),None))
+    assert len(wl)==1
+    t = wl.pop(0)
+    assert t.cst==0x1000 and wl.current==(0x1000,0)
+    wl.extend([sa.target(c(0x2000,32),None),sa.target(c(0x3000,32),None)])
+    assert len(wl)==2
+    assert wl.pop().cst==0x3000
+    p = amoco.load_program(ploop)
+    z = sa.fforward(p)
+    z.policy = dict(z.policy, budget=3)
+    G = z.getcfg()
+    assert z.spool.total==3
+    assert 0<G.order()<sa.fforward(p).getcfg().order()
+
+def test_worklist_function():
+    c = amoco.cas.expressions.cst
+    n = sa.cfg.node(sa.code.block([]))
+    t = lambda a,p=None: sa.target(c(a,32),p)
+    wl = sa.worklist("unexplored-function-first", entries=[0x1000,0x2000])
+    wl.extend([t(0x1000),t(0x2000)])
+    assert wl.pop().cst==0x2000
+    wl.extend([t(0x2001,n),t(0x2002,n)])
+    assert wl.pop().cst==0x1000
+    wl.push(t(0x1001,n))
+    assert wl.pop().cst==0x1001
+    wl.push(t(0x1002,n))
+    assert wl.pop().cst==0x2002
+    assert wl.spent=={0x1000:2, 0x2000:2}
+    # 0x2001 was pushed when its function was less explored:
+    assert wl.pop().cst==0x1002
+    assert wl.pop().cst==0x2001
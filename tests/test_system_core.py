@@ -61,6 +61,39 @@ def test_memory_004(M,sc1,p,y):
     assert res[1]==p.base
     assert res[2]==b'\xcd\x80'
 
+def test_memory_005():
+    from amoco.system.memory import MemoryZone
+    z = MemoryZone()
+    for a in range(0x100,0,-8):
+        z.write(a, cst(a,32))
+    z.write(0x20, b'A'*0x14)
+    z.write(0x22, cst(0x4243,16))
+    assert [o.vaddr for o in z._map] == sorted(o.vaddr for o in z._map)
+    assert z.locate(0x20) == 3
+    assert z.locate(0x25) == 5
+    assert z.locate(0x7) is None
+    assert z.read(0x30,12)[0] == b'AAAA'
+    assert z.read(0x30,12)[2] == cst(0x38,32)
+    assert z.read(0x20,6) == [b'AA', cst(0x4243,16), b'AA']
+    assert [x.size for x in z.read(0x102,8)] == [16,48]
+
+def test_memory_cow(sc1,y):
+    from amoco.system.memory import MemoryMap
+    M = MemoryMap()
+    M.write(0x0, sc1)
+    M.write(cst(0x10,32), y)
+    C = M.copy()
+    assert C._zones[None]._map[0] is M._zones[None]._map[0]
+    C.write(0x2, b'AAAA')
+    C.write(0x12, cst(0x4243,16))
+    assert M.read(0x2,4)[0] == sc1[2:6]
+    assert C.read(0x2,4)[0] == b'AAAA'
+    assert M.read(0x10,4)[0] == y
+    assert C.read(0x12,2)[0] == cst(0x4243,16)
+    M.write(0x3, b'B')
+    assert C.read(0x3,1)[0] == b'A'
+    assert M.read(0x2,2)[0] == sc1[2:3]+b'B'
+
 def test_pickle_memorymap(a,m):
     from pickle import dumps,loads,HIGHEST_PROTOCOL
     pickler = lambda x: dumps(x,HIGHEST_PROTOCOL)
@@ -19,3 +19,31 @@ def test_parser_elf64(samples):
                 assert p.Ehdr.e_ident.ELFMAG==b'ELF'
                 assert p.Ehdr.e_ident.EI_CLASS==2
 
+
+def test_elf_index(samples):
+    for filename in samples:
+        if filename.endswith('cxx.elf64'):
+            with open(filename,'rb') as f:
+                p = Elf(DataIO(f))
+                a = p.getaddress('main')
+                assert p.functions[a][0] == 'main'
+                s, off, base = p.getinfo('main')
+                assert s.name == '.text' and base+off == a
+                assert p.getinfo(a+1) == (s, off+1, base)
+                assert p.getsymbol(a) == ('main', 0)
+                assert p.getsymbol(a+1) == ('main', 1)
+                assert p.getaddress('nosuchsymbol') is None
+                assert p.getinfo('nosuchsymbol')[0] is None
+                assert p.getinfo(0xffffffff00)[0] is None
+
+def test_elf_lazy_symbols(samples):
+    for filename in samples:
+        if filename.endswith('cxx.elf64'):
+            with open(filename,'rb') as f:
+                p = Elf(DataIO(f))
+                assert p._functions is None and p._variables is None
+                a = p.getaddress('main')
+                assert p._functions is not None
+                L = p.getsymbols(a, a+p.functions[a][1])
+                assert L == [(a, 'main')]
+                assert p.getsymbols(0, 1) == []
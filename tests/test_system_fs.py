@@ -0,0 +1,59 @@
+import pytest
+import struct
+
+from amoco.system.core import DataIO
+from amoco.system.fs.ufs import *
+
+def _ufsimage():
+    fsz, bsz = 1024, 4096
+    img = bytearray(256 * fsz)
+    sb = dict(fs_cblkno=16, fs_iblkno=24, fs_ncg=1, fs_bsize=bsz, fs_fsize=fsz,
+              fs_frag=4, fs_fragshift=2, fs_cgmask=0xFFFFFFFF, fs_ipg=32,
+              fs_fpg=256, fs_magic=UFS_MAGIC)
+    off = 0
+    for f in superblock().fields:
+        off = f.align(off)
+        if f.name in sb:
+            img[SBOFF + off : SBOFF + off + 4] = struct.pack("<I", sb[f.name])
+        off += f.size()
+    img[16 * fsz + 4 : 16 * fsz + 8] = struct.pack("<i", CG_MAGIC)
+
+    def setinode(n, mode, size, db, ib=(0, 0, 0)):
+        off = 24 * fsz + n * 128
+        img[off : off + 16] = struct.pack("<HHHHQ", mode, 1, 0, 0, size)
+        db = list(db) + [0] * (12 - len(db))
+        img[off + 40 : off + 100] = struct.pack("<12i3i", *(db + list(ib)))
+
+    def setdir(frag, entries):
+        off = frag * fsz
+        for ino, name in entries:
+            img[off : off + 8 + len(name)] = struct.pack("<ihh", ino, 8 + len(name), len(name)) + name
+            off += 8 + len(name)
+        return off - frag * fsz
+
+    sz = setdir(32, [(2, b"."), (2, b".."), (4, b"fw")])
+    setinode(2, IFDIR | 0o755, sz, [32])
+    sz = setdir(36, [(4, b"."), (2, b".."), (5, b"a.bin"), (6, b"b.bin")])
+    setinode(4, IFDIR | 0o755, sz, [36])
+    setinode(5, IFREG | 0o644, 5000, [40, 44])
+    img[40 * fsz : 40 * fsz + 5000] = bytes(range(250)) * 20
+    # b.bin: 12 direct blocks + 2 blocks from the first indirect block
+    setinode(6, IFREG | 0o644, 13 * bsz + 100, range(48, 96, 4), (200, 0, 0))
+    img[200 * fsz : 200 * fsz + 8] = struct.pack("<2i", 100, 104)
+    img[48 * fsz : 96 * fsz] = b"A" * (48 * fsz)
+    img[100 * fsz : 104 * fsz + 100] = b"B" * (bsz + 100)
+    return bytes(img)
+
+def test_ufs_lazy():
+    fs = UFS(DataIO(_ufsimage()))
+    assert len(fs._inodes) == 0 and len(fs._cgs) == 0
+    assert fs.cylinders[0].cg_magic == CG_MAGIC
+    assert list(fs.walk("/")) == [("/", ["fw"], []), ("/fw", [], ["a.bin", "b.bin"])]
+    a = fs.lookup("/fw/a.bin")
+    assert a is fs.inodes[5]
+    assert list(fs.extents(a)) == [(40 * 1024, 5000)]
+    assert fs.read("fw/a.bin") == bytes(range(250)) * 20
+    b = fs.read("/fw/b.bin")
+    assert b == b"A" * (12 * 4096) + b"B" * (4096 + 100)
+    assert fs.lookup("/fw/c.bin") is None
+    assert len(fs._inodes) == 4
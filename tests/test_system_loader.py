@@ -1,3 +1,4 @@
+import os
 import pytest
 
 import amoco
@@ -14,3 +15,105 @@ def test_loader_003(sc1):
     p = amoco.load_program(sc1)
     assert p.bin.f.getvalue() == sc1
     assert p.bin.filename == '(sc-eb165e31...)'
+
+def test_loader_range(sc1):
+    from amoco.arch.x86 import cpu_x86
+    p = amoco.load_program(sc1)
+    p.cpu = cpu_x86
+    l = list(p.disassemble_range(0))
+    assert l[0].mnemonic == 'JMP'
+    assert l[0].address == 0
+    i = p.read_instruction(l[-1].address)
+    assert i.mnemonic == l[-1].mnemonic
+    assert sum(i.length for i in l) == l[-1].address.value + l[-1].length
+    l = list(p.cpu.disassemble.disassemble_range(sc1, 0x1000, 0x1004))
+    assert [i.mnemonic for i in l] == ['JMP','POP','XOR']
+    assert l[1].address == 0x1002
+
+def test_loader_icache(sc1):
+    from amoco.arch.x86 import cpu_x86
+    p = amoco.load_program(sc1)
+    p.cpu = cpu_x86
+    i = p.read_instruction(0)
+    assert i.mnemonic == 'JMP'
+    # cache hits are copies that don't share misc or operands:
+    i.misc['tag'] = 1
+    i.operands[0] = None
+    k = p.read_instruction(0)
+    assert k is not i and k.bytes == i.bytes
+    assert k.misc['tag'] is None and k.operands[0] is not None
+    assert len(p.icache) == 1
+    # overwrite the JMP with a NOP:
+    p.state.mmap.write(1, b'\x90')
+    assert p.read_instruction(1).mnemonic == 'NOP'
+    p.state.mmap.write(0, b'\x90')
+    j = p.read_instruction(0)
+    assert j is not i
+    assert j.mnemonic == 'NOP'
+    assert p.read_instruction(0).mnemonic == 'NOP'
+
+def test_read_program(samples):
+    from amoco.system.core import read_program, DataIO
+    p = read_program(b"\x00\x01\x02\x03")
+    assert isinstance(p, DataIO)
+    for f in samples:
+        if f.endswith('.hex'):
+            assert read_program(f).__class__.__name__ == 'HEX'
+        if f.endswith('.exe'):
+            assert read_program(f).__class__.__name__ == 'PE'
+
+def test_loader_views(samples):
+    from pickle import dumps, loads
+    for f in samples:
+        if f.endswith('cxx.elf64'): break
+    p = amoco.load_program(f)
+    z = p.state.mmap._zones[None]
+    o = z._map[0]
+    assert isinstance(o.data.val, memoryview)
+    x = p.state.mmap.read(o.vaddr+4, 4)[0]
+    assert isinstance(x, bytes)
+    p.state.mmap.write(o.vaddr+4, b'\x90\x90AB')
+    assert isinstance(z._map[0].data.val, memoryview)
+    assert b''.join(p.state.mmap.read(o.vaddr+2, 4))[2:] == b'\x90\x90'
+    assert p.read_instruction(o.vaddr+3).length == 2
+    M = loads(dumps(z._map[0]))
+    assert M.data.val == bytes(z._map[0].data.val)
+
+def test_snapshot(samples, tmp_path):
+    from amoco.system import snapshot
+    for f in samples:
+        if f.endswith('.elf64'):
+            p = amoco.load_program(f)
+            s = str(tmp_path / 'task.snap')
+            snapshot.save(p, s)
+            q = snapshot.restore(s)
+            assert q.__class__ is p.__class__ and q.cpu is p.cpu
+            assert str(q.state) == str(p.state)
+            assert q.OS.tasks == [q]
+            pc = q.state(q.cpu.PC())
+            assert pc == p.state(p.cpu.PC())
+            assert q.read_instruction(pc).mnemonic == p.read_instruction(pc).mnemonic
+            assert q.bin._symbols_index is not None
+            for o in q.state.mmap._zones[None]._map:
+                if o.data._is_raw:
+                    assert isinstance(o.data.val, memoryview)
+                else:
+                    assert o.data.val.stub is not None
+            # a snapshot is not restored if its binary has changed:
+            b = tmp_path / 'task.elf64'
+            b.write_bytes(open(f, 'rb').read())
+            snapshot.save(amoco.load_program(str(b)), s)
+            # a touched but unchanged binary is accepted:
+            mt = os.stat(b).st_mtime_ns + 10**9
+            os.utime(b, ns=(mt, mt))
+            assert snapshot.restore(s).bin is not None
+            data = bytearray(b.read_bytes())
+            data[-1] ^= 0xff
+            b.write_bytes(bytes(data))
+            os.utime(b, ns=(mt + 10**9, mt + 10**9))
+            with pytest.raises(snapshot.SnapshotError):
+                snapshot.restore(s)
+    # programs loaded from bytes have no binary file:
+    p = amoco.load_program(b"\x40\xc3")
+    snapshot.save(p, s)
+    assert snapshot.restore(s).bin is None
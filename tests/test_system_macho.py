@@ -14,3 +14,41 @@ def test_parser_macho(samples):
                 else:
                     assert p.header.filetype==MH_EXECUTE
 
+
+def test_macho_fat_slice(samples):
+    import struct
+    for filename in samples:
+        if filename.endswith('toc.mach-o'):
+            with open(filename,'rb') as f:
+                data = f.read()
+            sz = len(data)
+            fat = struct.pack('>II',0xcafebabe,2)
+            fat += struct.pack('>IIIII',X86_64,3,0x1000,sz,12)
+            fat += struct.pack('>IIIII',ARM,0,0x1000,sz,12)
+            fat = fat.ljust(0x1000,b'\0')+data
+            p = MachO(DataIO(fat),cputype=ARM)
+            assert p.archs[0].bin is None
+            b = p.archs[1].bin
+            assert b.header.magic == MH_MAGIC_64
+            x = p.slice(X86_64)
+            assert x is p.archs[0].bin
+            assert p.slice(POWERPC) is None
+            d = x.dyld_info
+            assert len(d.bind) == 3
+            assert d.bind[1] == (2, 8, 1, BIND_TYPE_POINTER, 0, 0, b'_toc_extern_export')
+            assert list(d.rebase) == [(3,0,1), (3,8,1), (3,16,1)]
+            assert b'_printf' in x.la_symbol_ptr[0x100002000]
+            assert list(x.function_starts) == x.entrypoints
+
+def test_bind_opcodes():
+    raw = bytes([BIND_OPCODE_SET_DYLIB_ORDINAL_IMM|1,
+                 BIND_OPCODE_SET_SYMBOL_TRAILING_FLAGS_IMM])+b'_f\0'
+    raw += bytes([BIND_OPCODE_SET_TYPE_IMM|BIND_TYPE_POINTER,
+                  BIND_OPCODE_SET_SEGMENT_AND_OFFSET_ULEB|2, 0x80, 0x01,
+                  BIND_OPCODE_DO_BIND_ADD_ADDR_IMM_SCALED|1,
+                  BIND_OPCODE_DO_BIND_ULEB_TIMES_SKIPPING_ULEB, 2, 8,
+                  BIND_OPCODE_DONE])
+    t = BindTable(raw, 8)
+    assert [r[1] for r in t] == [128, 144, 160]
+    assert len(t) == 3 and len(t.symbols) == 1
+    assert t[2] == (2, 160, 1, 1, 0, 0, b'_f')
@@ -9,3 +9,36 @@ def test_parser_PE(samples):
             with open(filename,'rb') as f:
                 p = PE(DataIO(f))
 
+
+def test_PE_lazy_directories():
+    import struct
+    dirs = [(0,0)]*16
+    dirs[0] = (0x1000,40)
+    dirs[5] = (0x1100,12)
+    hdr = b'MZ'.ljust(0x3c,b'\0')+struct.pack('<I',0x40)
+    hdr += struct.pack('<IHHIIIHH',0x4550,0x14c,1,0,0,0,224,0x2102)
+    hdr += struct.pack('<HBBIIIIIIIIIHHHHHHIIIIHHIIIIII',
+                       0x10b,0,0,0,0,0,0x1000,0x1000,0x1000,0x400000,
+                       0x1000,0x200,0,0,0,0,0,0,0,0x2000,0x200,0,0,0,
+                       0,0,0,0,0,16)
+    hdr += b''.join(struct.pack('<II',*d) for d in dirs)
+    hdr += struct.pack('<8sIIIIIIHHI',b'.rdata',0x200,0x1000,0x200,0x200,
+                       0,0,0,0,0x40000040)
+    sec = struct.pack('<IIHHIIIIIII',0,0,0,0,0x1080,1,2,2,0x1040,0x1050,0x1060)
+    sec = sec.ljust(0x40,b'\0')+struct.pack('<II',0x1010,0x1020)
+    sec = sec.ljust(0x50,b'\0')+struct.pack('<II',0x1070,0x1078)
+    sec = sec.ljust(0x60,b'\0')+struct.pack('<HH',1,0)
+    sec = sec.ljust(0x70,b'\0')+b'foo\0'
+    sec = sec.ljust(0x78,b'\0')+b'bar\0'
+    sec = sec.ljust(0x80,b'\0')+b'x.dll\0'
+    sec = sec.ljust(0x100,b'\0')+struct.pack('<IIHH',0x1000,12,0x3010,0)
+    p = PE(DataIO(hdr.ljust(0x200,b'\0')+sec.ljust(0x200,b'\0')))
+    assert p._exports is None and p._relocations is None
+    assert p.exports == {0x401020: 'foo', 0x401010: 'bar'}
+    assert p.ExportTable.NameRVA == 0x1080
+    assert p.getstring(0x401080, absolute=True) == 'x.dll'
+    assert p.relocations == [(0x1010, 3)]
+    assert p.functions == {}
+    assert p.tls is None
+    assert p.locate(0x1010) == (p.sections[0], 0x10)
+    assert p.getfileoffset(0x401010) == 0x210
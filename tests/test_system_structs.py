@@ -121,3 +121,31 @@ def test_Struct_CntFields():
     assert d.bstrAddinRegKey == b'abcd'
     assert d.dwCommandLineSafe == 3
 
+
+def test_Struct_iter_unpack():
+    S1 = StructFactory("S1","c*2: a\nI : b\nH*2 : c")
+    codec = compile_fields(S1.fields)
+    assert codec[0].size == S1.size() == 12
+    data = b'AB\0\0\x01\0\0\0\x02\0\x03\0'+b'CD\0\0\x04\0\0\0\x05\0\x06\0'
+    L = list(S1().iter_unpack(data))
+    assert len(L) == 2
+    assert L[0].a == b'AB' and L[0].b == 1 and L[0].c == (2,3)
+    assert L[1].a == b'CD' and L[1].b == 4 and L[1].c == (5,6)
+    # yielded structures don't share their fields:
+    assert L[0].fields is not L[1].fields
+    L[0].fields[1].order = '>'
+    assert L[1].fields[1].order != '>'
+    for f in L[1].fields:
+        f.order = '>'
+    assert S1.fields[1].order != '>'
+    assert L[0].fields[2].order != '>'
+    L = list(S1().iter_unpack(b'\xff'+data, offset=1, count=1))
+    assert L[0].a == b'AB' and L[0].c == (2,3)
+    s = S1()
+    s.fields[1].order = '>'
+    assert compile_fields(s.fields) is None
+    assert s.unpack(data, 12).b == 0x04000000
+    S2 = StructFactory("S2","I : x",order='>')
+    L = list(S2().iter_unpack(b'\0\0\0\x01xx\0\0\0\x02', stride=6))
+    assert [s.x for s in L] == [1,2]
+    assert compile_fields(StructFactory("S3","s*~I : s").fields) is None
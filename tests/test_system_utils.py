@@ -16,3 +16,31 @@ def test_parser_srec(samples):
         if filename[-4:]=='.srec':
             with open(filename,'rb') as f:
                 p = SREC(DataIO(f))
+
+def test_hex_coalesce(samples):
+    from amoco.system.memory import MemoryMap
+    for filename in samples:
+        if filename[-4:]=='.hex':
+            with open(filename,'rb') as f:
+                p = HEX(DataIO(f))
+                runs = p.load_binary()
+                assert len(runs) < len(p.L)
+                m1 = MemoryMap()
+                p.load_binary(m1)
+                m2 = MemoryMap()
+                for l in p.L:
+                    if l.HEXcode == Data:
+                        m2.write(l.address, l.data)
+                for a, v in runs:
+                    assert m1.read(a, len(v)) == m2.read(a, len(v)) == [v]
+
+def test_srecords():
+    lines = [b"S00600004844521B", b"S1130000285F245F2212226A000424290008237C2A",
+             b"S11300100002000800082629001853812341001813",
+             b"S5030002FA", b"S9030000FC"]
+    r = list(srecords(lines))
+    assert r[0] == (Header, 0, b"HDR")
+    assert r[1][0:2] == (Data16, 0) and len(r[1][2]) == 16
+    assert coalesce((a, d) for t, a, d in r if t == Data16) == [(0, r[1][2]+r[2][2])]
+    with pytest.raises(FormatError):
+        list(srecords([b"S1130000285F245F2212226A000424290008237C2B"]))